@@ -1,26 +1,107 @@
-from flask import Flask, request, send_from_directory, jsonify
-from flask_cors import CORS, cross_origin
+from backend.startup import timed, startup_report, print_startup_report
+with timed('import flask'):
+    from flask import Flask, Response, g, request, jsonify
+    from flask_cors import CORS
 from datetime import datetime, timedelta
-import csv
-import os
 from threading import Thread
-from backend.robin import get_account_info, run, get_crypto_data, execute_buy_order, get_crypto_position, get_crypto_historical, login_to_robinhood, CRYPTOS, STOP_SIGNAL
-from backend.table import plot_crypto_prices
-from backend.gpt import ask_gpt
+from time import perf_counter
+import base64
+import importlib
+import logging
+import os
+# Leaf modules first, so each step only measures the module it names rather than everything it pulls in;
+# modules app.py doesn't use directly are loaded through importlib just to time them
+with timed('import backend.metrics'):
+    from backend.metrics import METRICS, METRICS_ENABLED, HTTP_REQUEST_SECONDS
+with timed('import backend.broker_client'):
+    from backend.broker_client import CLIENT as BROKER_CLIENT
+with timed('import backend.events'):
+    from backend.events import EVENTS
+with timed('import backend.journal'):
+    from backend.journal import JOURNAL
+with timed('import backend.trade_store'):
+    from backend.trade_store import TRADE_STORE, public_trade, validate_trade, parse_timestamp, encode_cursor, decode_cursor, PAGE_SIZE, MAX_PAGE_SIZE
+with timed('import backend.pnl'):
+    from backend.pnl import PNL
+with timed('import backend.recorder'):
+    from backend.recorder import record_trade as record_trade_in_process, RECORDER
+with timed('import backend.broker'):
+    importlib.import_module('backend.broker')
+with timed('import backend.strategy'):
+    importlib.import_module('backend.strategy')
+with timed('import backend.orders'):
+    importlib.import_module('backend.orders')
+with timed('import backend.positions'):
+    importlib.import_module('backend.positions')
+with timed('import backend.quotes'):
+    importlib.import_module('backend.quotes')
+with timed('import backend.candles'):
+    from backend.candles import COLUMNS, to_records
+with timed('import backend.downsample'):
+    from backend.downsample import downsample, to_compact, MAX_POINTS
+with timed('import backend.indicators'):
+    from backend.indicators import INDICATOR_ENGINE, parse_names, latest_values, to_json
+with timed('import backend.table'):
+    from backend.table import cached_crypto_chart, RENDER_CACHE
+with timed('import backend.utils'):
+    importlib.import_module('backend.utils')
+with timed('import backend.gpt'):
+    from backend.gpt import warm_up as warm_up_gpt
+with timed('import backend.analysis'):
+    from backend.analysis import analyze_candles, ANALYSIS_CACHE
+with timed('import backend.sessions'):
+    from backend.sessions import SESSIONS, DEFAULT_ACCOUNT, SessionLimitError
+with timed('import backend.robin'):
+    from backend.robin import get_account_info, get_crypto_data, get_crypto_quotes, get_quote_stats, execute_buy_order, get_tracked_order, get_crypto_position, get_crypto_candles, get_candle_stats, warm_up_candles, login_to_robinhood, recover_orders, get_order_summary, quote_prices, CRYPTOS, POSITIONS
+with timed('import backend.engine'):
+    from backend.engine import to_seconds
 app = Flask(__name__, static_folder="public")
 CORS(app)
-login_to_robinhood()
 TRADES_FILE = 'trades.csv'
+# Trading session workers are spawned processes that re-import this module as __mp_main__, and
+# app.run(debug=True) keeps a reloader parent that only restarts the serving child; only the serving
+# process logs in, loads trades, owns the order journal and warms caches
+RELOADER_PARENT = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+if __name__ != '__mp_main__' and not RELOADER_PARENT:
+    with timed('login_to_robinhood'):
+        login_to_robinhood()
+    with timed('load trades'):
+        TRADE_STORE.migrate_csv(TRADES_FILE)
+        PNL.rebuild(TRADE_STORE.trades_by_status('filled'))
+    with timed('replay order journal'):
+        JOURNAL.open()
+    # Orders a previous run left pending are settled against the broker without holding up boot
+    Thread(target=recover_orders, daemon=True).start()
+    Thread(target=warm_up_candles, daemon=True).start()
+    # Tokenizer and OpenAI client load in the background so neither boot nor the first /ask-ai waits on them
+    Thread(target=warm_up_gpt, daemon=True).start()
+    print_startup_report()
+METRICS.collector('quote_cache', get_quote_stats)
+METRICS.collector('candle_cache', get_candle_stats)
+METRICS.collector('render_cache', RENDER_CACHE.stats)
+METRICS.collector('indicators', INDICATOR_ENGINE.stats)
+METRICS.collector('analysis_cache', ANALYSIS_CACHE.stats)
+METRICS.collector('positions', POSITIONS.stats)
+METRICS.collector('trade_recorder', RECORDER.stats)
+METRICS.collector('event_stream', EVENTS.stats)
+METRICS.collector('broker', BROKER_CLIENT.flat_stats)
+METRICS.collector('order_journal', JOURNAL.stats)
+
+
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_started = perf_counter()
 
 
-def read_trades():
-    trades = []
-    if os.path.exists(TRADES_FILE):
-        with open(TRADES_FILE, mode='r', newline='') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                trades.append(row)
-    return trades
+@app.after_request
+def observe_request(response):
+    if METRICS_ENABLED and 'request_started' in g:
+        # Label by route pattern rather than path so ids and symbols don't explode the series count
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(perf_counter() - g.request_started, route=route,
+                                     method=request.method, status=response.status_code)
+    return response
 
 
 @app.before_request
@@ -35,30 +116,80 @@ def handle_options():
         return response
 
 
-def write_trades(trades):
-    fieldnames = ['id', 'type', 'crypto', 'amount',
-                  'price', 'value', 'status', 'time']
-    with open(TRADES_FILE, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for trade in trades:
-            writer.writerow(trade)
-
-
 @app.route('/auto-trade/<time>/<interval>/<cryptos>', methods=['GET', 'POST'])
 def auto_trade(time: int, interval: str, cryptos: str):
     cryptos = cryptos.split(',')
     time = float(time)
+    account = request.args.get('account', DEFAULT_ACCOUNT)
     if request.method == 'GET':
-        STOP_SIGNAL.clear()
-        # Start the run function in a new thread
-        thread = Thread(target=run, args=(time, interval, cryptos))
-        print('Started Auto Trading Process')
-        thread.start()
-        return jsonify({'auto-trade': True}), 200
+        # Starting again while a session for the same account and cryptos runs returns that session
+        try:
+            session, created = SESSIONS.start(account, cryptos, to_seconds(time, interval))
+        except (ValueError, SessionLimitError) as e:
+            return jsonify({'auto-trade': False, 'error': str(e)}), 409
+        if created:
+            print('Started Auto Trading Process')
+        return jsonify({'auto-trade': True, 'session': session.to_dict(), 'created': created}), 200
     if request.method == 'POST':
-        STOP_SIGNAL.set()
-        return jsonify({'auto-trade': False}), 200
+        stopped = SESSIONS.stop_account(account)
+        return jsonify({'auto-trade': False, 'sessions': [session.to_dict() for session in stopped]}), 200
+
+
+@app.route('/sessions', methods=['GET', 'POST'])
+def sessions():
+    app.logger.info('Entering Sessions Endpoint')
+    if request.method == 'GET':
+        return jsonify({'sessions': [session.to_dict() for session in SESSIONS.list()]})
+    data = request.json or {}
+    cryptos = data.get('cryptos', [])
+    cryptos = cryptos.split(',') if isinstance(cryptos, str) else cryptos
+    if not cryptos:
+        return jsonify({'error': 'cryptos is required'}), 400
+    try:
+        run_time = to_seconds(float(data.get('time', 1)), data.get('interval', 'hours'))
+        session, created = SESSIONS.start(data.get('account', DEFAULT_ACCOUNT), cryptos, run_time)
+    except (ValueError, SessionLimitError) as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'session': session.to_dict(), 'created': created}), 201 if created else 200
+
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def session_status(session_id):
+    app.logger.info('Entering Session Status Endpoint')
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown session {session_id}'}), 404
+    return jsonify({'session': session.to_dict()})
+
+
+@app.route('/sessions/<session_id>/stop', methods=['POST'])
+def stop_session(session_id):
+    app.logger.info('Entering Stop Session Endpoint')
+    session = SESSIONS.stop(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown session {session_id}'}), 404
+    return jsonify({'session': session.to_dict()})
+
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    app.logger.info('Entering Stream Endpoint')
+    # EventSource sends Last-Event-ID when it reconnects, so missed trade and pnl events are replayed
+    subscription = EVENTS.subscribe(request.headers.get('Last-Event-ID', type=int))
+    initial = [('pnl', PNL.summary()), ('auto-trade', {'running': SESSIONS.running()})]
+    try:
+        quotes = get_crypto_quotes(CRYPTOS)
+        initial.append(('quotes', {crypto: quote_prices(quote) for crypto, quote in quotes.items()}))
+    except Exception as e:
+        print(f'Initial quotes for stream failed: {e}')
+    return Response(EVENTS.stream(subscription, initial), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/engine-metrics', methods=['GET'])
+def engine_metrics():
+    app.logger.info('Entering Engine Metrics Endpoint')
+    return jsonify({'sessions': {session.id: session.metrics for session in SESSIONS.list()}})
 
 
 @app.route('/account_info', methods=['GET', 'POST'])
@@ -73,43 +204,108 @@ def positions():
     app.logger.info('Entering Positions Endpoint')
     info = {}
     positions = get_crypto_position()
-    for position in positions:
-        currency = position['currency']['code']
-        og_value = position['cost_bases'][0]['direct_cost_basis']
-        quantity = position['cost_bases'][0]['direct_quantity']
-        if float(quantity) > 0:
-            current_data = get_crypto_data(currency)
-            curr_price = current_data['bid_price']
-            info[currency] = {
-                'quantity': quantity,
-                'og_value': og_value,
-                'curr_price': curr_price
-            }
+    held = [currency for currency, position in positions.items()
+            if position['direct_quantity'] > 0]
+    quotes = get_crypto_quotes(held)
+    for currency in held:
+        info[currency] = {
+            'quantity': str(positions[currency]['direct_quantity']),
+            'og_value': str(positions[currency]['cost_basis']),
+            'curr_price': quotes[currency]['bid_price']
+        }
     return jsonify({'positions': info})
 
 
 @app.route('/get-crypto-graph/<crypto>/<interval>/<span>/<price_data>', methods=['GET', 'POST'])
 def get_crypto_graph(crypto: str, interval: str, span: str, price_data: str):
     app.logger.info('Entering Crytpo Graph Endpoint')
-    data = get_crypto_historical(crypto, interval, span)
+    candles = get_crypto_candles(crypto, interval, span)
     price_data = price_data.split(',')
-    base64_image = plot_crypto_prices(data, interval, span, price_data)
-    return jsonify({'data': data, 'image': base64_image})
+    # ?points=0 disables downsampling, ?method=minmax keeps every bucket's extremes
+    points = request.args.get('points', MAX_POINTS, type=int)
+    method = request.args.get('method', 'lttb')
+    fields = [field for field in price_data if field in candles] or ['close_price']
+    # ?overlays=sma_20,bollinger draws indicators over the prices; RSI and volatility get their own panel
+    try:
+        overlay_names = parse_names(request.args['overlays']) if request.args.get('overlays') else []
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    overlays = INDICATOR_ENGINE.compute(crypto, interval, candles, overlay_names) if overlay_names else {}
+    # Overlays ride along as extra columns so downsampling keeps the same points for both
+    sampled = downsample({**candles, **overlays}, fields, points, method)
+    candles = {column: sampled[column] for column in COLUMNS}
+    overlays = {name: sampled[name] for name in overlays}
+    image, etag = cached_crypto_chart(
+        crypto, candles, interval, span, price_data, (points, method), overlays)
+    # ?image=png serves the raw image with an ETag so unchanged charts come back as 304s
+    if request.args.get('image') == 'png':
+        response = Response(image, mimetype='image/png')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    base64_image = base64.b64encode(image).decode('utf-8')
+    if request.args.get('format') == 'compact':
+        return jsonify({'data': to_compact(candles), 'image': base64_image})
+    return jsonify({'data': to_records(candles, crypto), 'image': base64_image})
+
+
+@app.route('/get-indicators/<crypto>/<interval>/<span>', methods=['GET'])
+def get_indicators(crypto: str, interval: str, span: str):
+    app.logger.info('Entering Indicators Endpoint')
+    # ?names=sma_20,rsi takes a subset; values still warming up are null
+    try:
+        names = parse_names(request.args.get('names'))
+        candles, indicators = INDICATOR_ENGINE.window(crypto, interval, span, names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'begins_at': candles['begins_at'].tolist(),
+                    'indicators': to_json(indicators),
+                    'latest': latest_values(indicators)})
+
+
+@app.route('/indicator-stats', methods=['GET'])
+def indicator_stats():
+    app.logger.info('Entering Indicator Stats Endpoint')
+    return jsonify({'indicator_stats': INDICATOR_ENGINE.stats()})
+
+
+@app.route('/candle-stats', methods=['GET'])
+def candle_stats():
+    app.logger.info('Entering Candle Stats Endpoint')
+    return jsonify({'candle_stats': get_candle_stats()})
+
+
+@app.route('/broker-stats', methods=['GET'])
+def broker_stats():
+    app.logger.info('Entering Broker Stats Endpoint')
+    return jsonify({'broker': BROKER_CLIENT.stats()})
+
+
+@app.route('/order-summary', methods=['GET'])
+def order_summary():
+    app.logger.info('Entering Order Summary Endpoint')
+    return jsonify({'summary': get_order_summary(), 'journal': JOURNAL.stats()})
+
+
+@app.route('/render-stats', methods=['GET'])
+def render_stats():
+    app.logger.info('Entering Render Stats Endpoint')
+    return jsonify({'render_stats': RENDER_CACHE.stats()})
+
+
+@app.route('/startup-report', methods=['GET'])
+def get_startup_report():
+    app.logger.info('Entering Startup Report Endpoint')
+    return jsonify({'startup': startup_report()})
 
 
 @app.route('/todays-change', methods=['GET'])
 def successful_trades_sum():
     app.logger.info('Entering Change Endpoint')
-    trades = read_trades()
-    running_sum = 0
-    for trade in trades:
-        if trade['status'] == 'filled':
-            trade_gain = float(trade['amount']) * float(trade['price'][1:])
-            if trade['type'] == 'sell':
-                running_sum += trade_gain
-            else:
-                running_sum -= trade_gain
-    return jsonify({"successfulTradesSum": running_sum})
+    summary = PNL.summary()
+    return jsonify({"successfulTradesSum": summary['total'],
+                    "today": summary['today'],
+                    "byCrypto": summary['by_crypto'],
+                    "byDay": summary['by_day']})
 
 
 @app.route('/get-cryptos', methods=['GET'])
@@ -125,6 +321,12 @@ def get_crypto_info(crypto):
     return jsonify({'data': data})
 
 
+@app.route('/quote-stats', methods=['GET'])
+def quote_stats():
+    app.logger.info('Entering Quote Stats Endpoint')
+    return jsonify({'quote_stats': get_quote_stats()})
+
+
 @app.route('/buy-crypto/<crypto>/<amount>', methods=['GET', 'POST'])
 def buy_crypto(crypto, amount):
     app.logger.info('Entering Buy Crypto Endpoint')
@@ -132,11 +334,20 @@ def buy_crypto(crypto, amount):
     return jsonify({"message": message})
 
 
+@app.route('/order/<order_id>', methods=['GET'])
+def order_status(order_id):
+    app.logger.info('Entering Order Status Endpoint')
+    order = get_tracked_order(order_id)
+    if order is None:
+        return jsonify({'message': f'Unknown order {order_id}'}), 404
+    return jsonify({'order': order})
+
+
 @app.route('/ask-ai/<crypto>/<interval>/<span>', methods=['POST', 'GET'])
 def ask_ai(crypto, interval, span):
     app.logger.info('Entering AI Endpoint')
     data = request.json
-    response = ask_gpt(data, crypto, interval, span)
+    response = analyze_candles(data, crypto, interval, span)
     response = response.replace("Bullet", "")
     response = response.replace("Points", "")
     response = response.strip()
@@ -144,53 +355,67 @@ def ask_ai(crypto, interval, span):
     return jsonify({"response": response})
 
 
+@app.route('/analysis-stats', methods=['GET'])
+def analysis_stats():
+    app.logger.info('Entering Analysis Stats Endpoint')
+    return jsonify({'analysis_stats': ANALYSIS_CACHE.stats()})
+
+
 @app.route('/record-trade', methods=['POST', 'GET'])
 def record_trade():
     app.logger.info('Entering Record Trade Endpoint')
-    trade_data = request.json
-    trades = read_trades()
-    if len(trades) > 0:
-        existing_trade_index = next((index for index, trade in enumerate(
-            trades) if trade['id'] == trade_data['id']), None)
-    else:
-        existing_trade_index = None
-
-    if existing_trade_index is not None:
-        trades[existing_trade_index]['status'] = trade_data['status']
-    else:
-        # Ensure all fields are present and add the trade
-        trade_to_add = {field: trade_data.get(field, '') for field in [
-            'id', 'type', 'crypto', 'amount', 'price', 'value', 'status', 'time']}
-        trades.append(trade_to_add)
-
-    write_trades(trades)
+    trade_data = request.get_json(silent=True)
+    try:
+        validate_trade(trade_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # New ids are inserted with every field, known ids only get their status updated
+    record_trade_in_process(trade_data).result()
     return jsonify({"message": "Trade data processed successfully"}), 200
 
 
 @app.route('/get-trades', methods=['GET'])
 def get_trades():
     app.logger.info('Entering Get Trades Endpoint')
-    current_time = datetime.now()
-    five_minutes_ago = current_time - timedelta(minutes=10)
-    all_trades = read_trades()
-    trades = []
-    for trade in all_trades:
-        if trade['status'] == 'failed':
-            trade_time = trade['time'].replace(' ', '')
-            trade_time = datetime.strptime(trade_time, "%I:%M%p").replace(
-                year=current_time.year, month=current_time.month, day=current_time.day)
-            if trade_time > five_minutes_ago:
-                trades.append(trade)
-        else:
-            trades.append(trade)
-    trades = list(reversed(trades))
-    return jsonify(trades)
+    try:
+        limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        statuses = request.args.get('status', '').split(',') if request.args.get('status') else None
+        cryptos = request.args.get('crypto', '').split(',') if request.args.get('crypto') else None
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        since = parse_timestamp(request.args['since']) if request.args.get('since') else None
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    # The first page hides failures older than ten minutes like the old trade log; incremental
+    # fetches and explicit status filters return every matching change
+    failed_since = None if statuses or since is not None else (datetime.now() - timedelta(minutes=10)).timestamp()
+    # Read before the page so a change landing mid-request is fetched again rather than missed
+    latest = TRADE_STORE.latest_update() if since is None else since
+    # One extra row tells us whether there's another page without a COUNT query
+    rows = TRADE_STORE.query(statuses, cryptos, start, end, failed_since, since, cursor, limit + 1)
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1], updated=since is not None) if len(rows) > limit else None
+    if since is not None and page:
+        latest = page[-1]['updated_at']
+    return jsonify({'trades': [public_trade(trade) for trade in page],
+                    'next_cursor': next_cursor,
+                    'since': latest})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not METRICS_ENABLED:
+        return Response('Metrics are disabled, set TRADING_METRICS=1 to enable\n', status=404, mimetype='text/plain')
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.before_request
 def log_request_info():
-    app.logger.debug('Headers: %s', request.headers)
-    app.logger.debug('Body: %s', request.get_data())
+    # Reading the body on every request is only worth it when someone is looking at debug logs
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug('Headers: %s', request.headers)
+        app.logger.debug('Body: %s', request.get_data())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from backend.candles import from_payload
+from backend.downsample import lttb
+from backend.indicators import compute_indicators, latest_values
+from backend.gpt import request_analysis
+
+ANALYSIS_TTL = 600
+SAMPLE_POINTS = 24
+
+
+def iso_time(timestamp: int) -> str:
+    return str(np.datetime64(int(timestamp), 's')) + 'Z'
+
+
+def summarize_candles(candles: dict) -> dict:
+    """
+    Compresses a candle series into the statistics the prompt needs, so token counts no longer scale with the span.
+    """
+    begins_at = candles['begins_at']
+    close = candles['close_price']
+    if len(close) == 0:
+        return {'candles': 0}
+    high_index = int(np.argmax(candles['high_price']))
+    low_index = int(np.argmin(candles['low_price']))
+    returns = np.diff(np.log(close)) if len(close) > 1 and (close > 0).all() else np.zeros(0)
+    days = (begins_at - begins_at[0]) / 86400.0
+    slope = np.polyfit(days, close, 1)[0] if len(close) > 1 and days[-1] > 0 else 0.0
+    running_max = np.maximum.accumulate(close)
+    sample = lttb(begins_at, close, SAMPLE_POINTS)
+    return {
+        'candles': int(len(close)),
+        'start': iso_time(begins_at[0]),
+        'end': iso_time(begins_at[-1]),
+        'first_close': float(close[0]),
+        'last_close': float(close[-1]),
+        'change_pct': float((close[-1] / close[0] - 1) * 100) if close[0] else 0.0,
+        'high': {'price': float(candles['high_price'][high_index]), 'time': iso_time(begins_at[high_index])},
+        'low': {'price': float(candles['low_price'][low_index]), 'time': iso_time(begins_at[low_index])},
+        'mean_close': float(close.mean()),
+        'volatility_pct': float(returns.std() * 100) if len(returns) else 0.0,
+        'trend_per_day_pct': float(slope / close.mean() * 100) if close.mean() else 0.0,
+        'max_drawdown_pct': float(((close - running_max) / running_max).min() * 100),
+        'total_volume': float(candles['volume'].sum()),
+        'indicators': latest_values(compute_indicators(candles)),
+        'sampled_closes': [[iso_time(begins_at[index]), float(close[index])] for index in sample],
+    }
+
+
+def candles_digest(candles: dict) -> str:
+    digest = hashlib.sha256()
+    for column in sorted(candles):
+        digest.update(np.ascontiguousarray(candles[column]).tobytes())
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, ttl: float = ANALYSIS_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    def _evict(self, now: float) -> None:
+        for key in [key for key, (expires, _) in self.entries.items() if expires <= now]:
+            del self.entries[key]
+
+    def get_or_compute(self, key: tuple, compute) -> str:
+        with self.lock:
+            now = time.time()
+            self._evict(now)
+            if key in self.entries:
+                self.hits += 1
+                return self.entries[key][1]
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                # This caller makes the upstream request; identical concurrent requests wait on its future
+                self.misses += 1
+                self.upstream_calls += 1
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+            with self.lock:
+                self.entries[key] = (time.time() + self.ttl, result)
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+        return future.result()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'coalesced': self.coalesced, 'upstream_calls': self.upstream_calls}
+
+
+ANALYSIS_CACHE = AnalysisCache()
+
+
+def analyze_candles(payload, crypto: str, interval: str, span: str) -> str:
+    candles = from_payload(payload)
+    key = (crypto, interval, span, candles_digest(candles))
+    try:
+        return ANALYSIS_CACHE.get_or_compute(
+            key, lambda: request_analysis(summarize_candles(candles), crypto, interval, span))
+    except ValueError as e:
+        return str(e)
+    except Exception as e:
+        return f"An error occurred: {e}"
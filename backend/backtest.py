@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from backend.candles import CANDLES, INTERVAL_SECONDS
+from backend.strategy import MINS, SELL_FRACTION, GAIN_THRESHOLD
+
+TOLERANCE = 1e-9
+MAX_SEARCH_CHUNK = 65536
+DEFAULT_GRID = {'sell_fraction': [SELL_FRACTION], 'threshold': [GAIN_THRESHOLD], 'poll_interval': [15]}
+WORKER_CANDLES = {}
+
+
+def sell_signals(crypto: str, prices: np.ndarray, holdings: float, initial_value: float,
+                 sell_fraction: float, threshold: float) -> tuple:
+    # Vectorized take_profit_quantity: which prices trigger a sell and for how much
+    current_value = prices * holdings
+    to_sell = current_value - initial_value
+    to_sell = np.where(to_sell > threshold - TOLERANCE, to_sell * sell_fraction, to_sell)
+    quantities = to_sell / prices
+    signals = (current_value > initial_value - TOLERANCE) & (quantities > MINS[crypto] - TOLERANCE)
+    return signals, quantities
+
+
+def next_sell(crypto: str, prices: np.ndarray, start: int, holdings: float, initial_value: float,
+              sell_fraction: float, threshold: float, order_decimals: int) -> tuple:
+    """
+    Finds the next poll that places a real sell, returning (index, order quantity, skipped triggers before it).
+
+    Live orders go out as round_value(quantity); the engine skips triggers whose quantity rounds to zero
+    instead of placing them, so they're counted as skipped without blocking the symbol.
+    """
+    # Holdings are constant between fills, so scan ahead in growing chunks for the next trigger;
+    # small first chunks keep back-to-back sells cheap, doubling keeps long quiet stretches vectorized
+    chunk_size = 16
+    chunk_start = start
+    skipped = 0
+    while chunk_start < len(prices):
+        chunk = prices[chunk_start:chunk_start + chunk_size]
+        signals, quantities = sell_signals(
+            crypto, chunk, holdings, initial_value, sell_fraction, threshold)
+        order_quantities = np.round(quantities, order_decimals)
+        placed = np.flatnonzero(signals & (order_quantities > 0))
+        end = placed[0] if len(placed) else len(chunk)
+        skipped += int(np.count_nonzero(signals[:end]))
+        if len(placed):
+            return chunk_start + int(placed[0]), float(order_quantities[placed[0]]), skipped
+        chunk_start += chunk_size
+        chunk_size = min(chunk_size * 2, MAX_SEARCH_CHUNK)
+    return None, 0.0, skipped
+
+
+def backtest_symbol(crypto: str, candles: dict, interval: str, sell_fraction: float = SELL_FRACTION,
+                    threshold: float = GAIN_THRESHOLD, poll_interval: float = 15, starting_value: float = 100.0,
+                    fill_delay: int = 1, fill_probability: float = 1.0, fee_bps: float = 0.0,
+                    order_decimals: int = 2, seed: int = 0) -> dict:
+    """
+    Replays the trading engine's take-profit rule over one symbol's candles.
+
+    Each poll sees the candle close; a sell placed at poll i fills at the close fill_delay polls later with
+    probability fill_probability (otherwise it fails), and no new sell is placed while one is outstanding.
+    """
+    step = max(1, int(round(poll_interval / INTERVAL_SECONDS[interval])))
+    prices = candles['close_price'][::step]
+    rng = np.random.default_rng(seed)
+    if len(prices) == 0:
+        return {'crypto': crypto, 'polls': 0, 'trades': 0, 'failed': 0, 'skipped': 0, 'pnl': 0.0}
+    holdings = starting_value / prices[0]
+    initial_value = holdings * prices[0]
+    proceeds = 0.0
+    trades = 0
+    failed = 0
+    skipped = 0
+    index = 0
+    while index < len(prices):
+        index, order_quantity, skipped_before = next_sell(
+            crypto, prices, index, holdings, initial_value, sell_fraction, threshold, order_decimals)
+        skipped += skipped_before
+        if index is None:
+            break
+        fill_index = min(index + fill_delay, len(prices) - 1)
+        if rng.random() >= fill_probability:
+            failed += 1
+        else:
+            holdings -= order_quantity
+            proceeds += order_quantity * prices[fill_index] * (1 - fee_bps / 10000)
+            trades += 1
+        index = fill_index + 1
+    final_value = holdings * prices[-1]
+    return {
+        'crypto': crypto,
+        'polls': int(len(prices)),
+        'trades': trades,
+        'failed': failed,
+        'skipped': skipped,
+        'realized': float(proceeds),
+        'final_holdings': float(holdings),
+        'pnl': float(proceeds + final_value - initial_value),
+        'buy_and_hold_pnl': float(initial_value / prices[0] * prices[-1] - initial_value),
+    }
+
+
+def init_worker(candles_by_symbol: dict) -> None:
+    WORKER_CANDLES.update(candles_by_symbol)
+
+
+def run_parameters(params: dict) -> dict:
+    started = time.perf_counter()
+    interval = params.pop('interval')
+    results = [backtest_symbol(crypto, candles, interval, **params)
+               for crypto, candles in WORKER_CANDLES.items()]
+    return {
+        'params': params,
+        'pnl': sum(result['pnl'] for result in results),
+        'trades': sum(result['trades'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+        'skipped': sum(result['skipped'] for result in results),
+        'symbols': results,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def load_candles(cryptos: list, interval: str, span: str, offline: bool = False) -> dict:
+    candles_by_symbol = {}
+    for crypto in cryptos:
+        if offline:
+            candles_by_symbol[crypto] = CANDLES.stored(crypto, interval)
+        else:
+            candles_by_symbol[crypto] = CANDLES.window(crypto, interval, span)
+    return candles_by_symbol
+
+
+def sweep(candles_by_symbol: dict, interval: str, grid: dict = DEFAULT_GRID, workers: int = None, **fill_assumptions) -> list:
+    names = list(grid)
+    combos = [dict(zip(names, values), interval=interval, **fill_assumptions)
+              for values in itertools.product(*(grid[name] for name in names))]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(candles_by_symbol,)) as pool:
+        results = list(pool.map(run_parameters, combos))
+    return sorted(results, key=lambda result: result['pnl'], reverse=True)
+
+
+def parse_floats(value: str) -> list:
+    return [float(item) for item in value.split(',')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Backtest the take-profit trading strategy')
+    parser.add_argument('--cryptos', default='DOGE,BTC,SHIB,XTZ,XLM,ETH')
+    parser.add_argument('--interval', default='15second')
+    parser.add_argument('--span', default='day')
+    parser.add_argument('--offline', action='store_true', help='only use candles already in the candle store')
+    parser.add_argument('--sell-fraction', type=parse_floats, default=[SELL_FRACTION])
+    parser.add_argument('--threshold', type=parse_floats, default=[GAIN_THRESHOLD])
+    parser.add_argument('--poll-interval', type=parse_floats, default=[15.0])
+    parser.add_argument('--fill-delay', type=int, default=1)
+    parser.add_argument('--fill-probability', type=float, default=1.0)
+    parser.add_argument('--fee-bps', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    candles_by_symbol = load_candles(args.cryptos.split(','), args.interval, args.span, args.offline)
+    grid = {'sell_fraction': args.sell_fraction, 'threshold': args.threshold,
+            'poll_interval': args.poll_interval}
+    results = sweep(candles_by_symbol, args.interval, grid, args.workers, fill_delay=args.fill_delay,
+                    fill_probability=args.fill_probability, fee_bps=args.fee_bps)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+RENDER_PAIRS = [('15second', 'hour'), ('5minute', 'day'), ('hour', 'week'),
+                ('hour', 'month'), ('day', 'year'), ('week', '5year')]
+SEED_BATCH = 50000
+REGRESSION_THRESHOLD = 0.10
+
+
+def summarize(samples: list, wall: float) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': ordered[-1],
+        'throughput': len(samples) / wall if wall else 0.0,
+    }
+
+
+def measure(call, count: int, concurrency: int = 1) -> dict:
+    def timed_call(index: int) -> float:
+        started = time.perf_counter()
+        call(index)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(timed_call, range(count)))
+    else:
+        samples = [timed_call(index) for index in range(count)]
+    return summarize(samples, time.perf_counter() - started)
+
+
+def scaled_count(requests: int, rows: int) -> int:
+    # Whole-history endpoints get slow at 1M rows; keep the run bounded without dropping below a few samples
+    return max(3, min(requests, requests * 10000 // rows))
+
+
+def fake_trade(rng: random.Random, cryptos: list, created_at: float) -> tuple:
+    crypto = rng.choice(cryptos)
+    amount = round(rng.uniform(1, 100), 2)
+    price = rng.uniform(0.01, 10)
+    status = rng.choices(['filled', 'failed', 'pending'], [8, 1, 1])[0]
+    return (str(uuid.uuid4()), rng.choice(['sell', 'sell', 'buy']), crypto, str(amount), f'${price:.6f}',
+            f'${amount * price:.2f}', status, time.strftime('%I:%M %p', time.localtime(created_at)),
+            created_at, created_at)
+
+
+def seed_trades(store, pnl, rows: int, cryptos: list, seed: int = 0) -> None:
+    """
+    Replaces the store's contents with rows synthetic trades spread over the last 30 days, a slice of them
+    inside /get-trades' 10 minute failed-trade window, and rebuilds the P&L aggregates from them.
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    with store.lock:
+        conn = store._connect()
+        conn.execute('DELETE FROM trades')
+        for start in range(0, rows, SEED_BATCH):
+            batch = [fake_trade(rng, cryptos, now - (rng.uniform(0, 600) if rng.random() < 0.01 else rng.uniform(0, 30 * 86400)))
+                     for _ in range(start, min(rows, start + SEED_BATCH))]
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO trades (id, type, crypto, amount, price, value, status, time, created_at, updated_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            conn.execute('COMMIT')
+    pnl.rebuild(store.trades_by_status('filled'))
+
+
+def benchmark_endpoints(app, sizes: list, requests: int, concurrency: int) -> dict:
+    from backend.trade_store import TRADE_STORE
+    from backend.pnl import PNL
+    from backend.robin import CRYPTOS
+    from backend.table import RENDER_CACHE
+    clients = {}
+
+    def client():
+        # Flask test clients aren't shared between threads
+        key = threading.get_ident()
+        if key not in clients:
+            clients[key] = app.test_client()
+        return clients[key]
+
+    def get(url: str):
+        response = client().get(url)
+        assert response.status_code in (200, 304), f'{url} returned {response.status_code}'
+        return response
+
+    results = {}
+    for rows in sizes:
+        started = time.perf_counter()
+        seed_trades(TRADE_STORE, PNL, rows, CRYPTOS)
+        results[f'seed[rows={rows}]'] = {'seconds': time.perf_counter() - started}
+        count = scaled_count(requests, rows)
+        results[f'/get-trades[rows={rows}]'] = measure(lambda i: get('/get-trades'), count, concurrency)
+        since = time.time() - 60
+        results[f'/get-trades?since[rows={rows}]'] = measure(
+            lambda i: get(f'/get-trades?since={since}'), requests, concurrency)
+        results[f'/todays-change[rows={rows}]'] = measure(lambda i: get('/todays-change'), requests, concurrency)
+
+        def record(index: int):
+            trade = {'id': str(uuid.uuid4()), 'type': 'sell', 'crypto': 'DOGE', 'amount': '1.0',
+                     'price': '$0.150000', 'value': '$0.15', 'status': 'filled', 'time': '12:00 PM'}
+            response = client().post('/record-trade', json=trade)
+            assert response.status_code == 200, f'/record-trade returned {response.status_code}'
+        results[f'/record-trade[rows={rows}]'] = measure(record, requests, concurrency)
+    results['/positions'] = measure(lambda i: get('/positions'), requests, concurrency)
+    for interval, span in RENDER_PAIRS[:3]:
+        url = f'/get-crypto-graph/DOGE/{interval}/{span}/close_price'
+        results[f'{url}?format=compact'] = measure(lambda i: get(url + '?format=compact'), requests, concurrency)
+
+        def render(index: int):
+            RENDER_CACHE.clear()
+            get(url + '?image=png')
+        results[f'{url}?image=png[cold]'] = measure(render, max(3, requests // 5), 1)
+        results[f'{url}?image=png[cached]'] = measure(lambda i: get(url + '?image=png'), requests, concurrency)
+    return results
+
+
+def benchmark_rendering(requests: int) -> dict:
+    from backend.candles import CANDLES
+    from backend.table import plot_crypto_prices
+    results = {}
+    for interval, span in RENDER_PAIRS:
+        candles = CANDLES.window('DOGE', interval, span)
+        stats = measure(lambda i: plot_crypto_prices(candles, interval, span, ['close_price', 'high_price', 'low_price']),
+                        max(3, requests // 5))
+        stats['candles'] = int(len(candles['begins_at']))
+        results[f'plot_crypto_prices[{interval}/{span}]'] = stats
+    return results
+
+
+def benchmark_engine(iterations: int) -> dict:
+    from backend.engine import TradingEngine
+    from backend.robin import CRYPTOS
+    engine = TradingEngine(CRYPTOS, run_time=float('inf'))
+    engine.start()
+    with engine.pool() as pool:
+        stats = measure(lambda i: engine.tick(pool, time.monotonic()), iterations)
+    stats['symbols'] = len(CRYPTOS)
+    return {'engine.tick': stats}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    Returns (name, metric, before, after, change, regressed) rows for every benchmark present in both runs,
+    comparing p50 latency (or seconds for one-off measurements).
+    """
+    rows = []
+    for name, after in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        metric = 'p50' if 'p50' in after else 'seconds'
+        if not before.get(metric):
+            continue
+        change = after[metric] / before[metric] - 1
+        rows.append((name, metric, before[metric], after[metric], change, change > threshold))
+    return rows
+
+
+def print_comparison(rows: list) -> None:
+    for name, metric, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<60} {metric:<8} {before * 1000:10.2f}ms -> {after * 1000:10.2f}ms ({change:+.1%}){flag}')
+
+
+def configure_environment(latency: float) -> str:
+    # Must run before anything imports backend.broker; every relative path (trades.db, candles/) lands in a scratch dir
+    os.environ.setdefault('TRADING_BROKER', 'sim')
+    os.environ.setdefault('SIM_LATENCY', str(latency))
+    os.environ.setdefault('SIM_LATENCY_JITTER', '0')
+    os.environ.setdefault('SIM_FILL_DELAY', '0')
+    workdir = tempfile.mkdtemp(prefix='trading-benchmark-')
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return workdir
+
+
+def parse_ints(value: str) -> list:
+    return [int(item) for item in value.split(',')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark endpoints and trading hot paths against the simulated broker')
+    parser.add_argument('--sizes', type=parse_ints, default=DEFAULT_SIZES, help='trade history sizes to seed')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint measurement')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--engine-iterations', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated broker latency in seconds')
+    parser.add_argument('--only', choices=['endpoints', 'render', 'engine'], action='append')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--keep-workdir', action='store_true', help='keep the scratch dir with the seeded trades.db')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    original_cwd = os.getcwd()
+    workdir = configure_environment(args.latency)
+    suites = args.only or ['endpoints', 'render', 'engine']
+    try:
+        import app as application
+        results = {}
+        if 'endpoints' in suites:
+            results.update(benchmark_endpoints(application.app, args.sizes, args.requests, args.concurrency))
+        if 'render' in suites:
+            results.update(benchmark_rendering(args.requests))
+        if 'engine' in suites:
+            results.update(benchmark_engine(args.engine_iterations))
+    finally:
+        os.chdir(original_cwd)
+        if args.keep_workdir:
+            print(f'Kept scratch dir {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        'meta': {'revision': git_revision(), 'timestamp': time.time(), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'workdir': workdir if args.keep_workdir else None,
+                 'args': vars(args)},
+        'results': results,
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Wrote {len(results)} benchmarks to {output}')
+    if baseline_path:
+        with open(baseline_path) as file:
+            rows = compare(json.load(file), report, args.threshold)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
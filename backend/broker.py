@@ -0,0 +1,24 @@
+import os
+
+BROKER = os.environ.get('TRADING_BROKER', 'robinhood')
+
+
+def load_broker(name: str = BROKER):
+    """
+    Returns the module-like broker every backend call goes through: robin_stocks.robinhood, or the local
+    simulator when TRADING_BROKER=sim (configured through the SIM_* environment variables).
+    """
+    if name == 'sim':
+        from backend.sim_broker import SimulatedBroker
+        return SimulatedBroker.from_env()
+    import robin_stocks.robinhood as robinhood
+    from backend.broker_client import configure_session
+    configure_session(robinhood.globals.SESSION)
+    return robinhood
+
+
+def is_simulated() -> bool:
+    return BROKER == 'sim'
+
+
+r = load_broker()
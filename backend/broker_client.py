@@ -0,0 +1,318 @@
+import os
+import random
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+REQUEST_TIMEOUT = float(os.environ.get('BROKER_TIMEOUT', 10.0))
+POOL_SIZE = int(os.environ.get('BROKER_POOL_SIZE', 16))
+GLOBAL_BUDGET = (float(os.environ.get('BROKER_RATE', 10.0)), 20)
+PRIORITY_ORDERS, PRIORITY_TRADING, PRIORITY_BACKGROUND = 0, 1, 2
+# Global tokens each lane leaves untouched, so polling can never starve order placement
+LANE_RESERVE = {PRIORITY_ORDERS: 0, PRIORITY_TRADING: 2, PRIORITY_BACKGROUND: 5}
+# endpoint: (calls per second, burst, priority, idempotent)
+ENDPOINTS = {
+    'orders': (2.0, 4, PRIORITY_ORDERS, False),
+    'order_status': (4.0, 8, PRIORITY_TRADING, True),
+    'quotes': (4.0, 8, PRIORITY_TRADING, True),
+    'positions': (2.0, 4, PRIORITY_TRADING, True),
+    'account': (1.0, 2, PRIORITY_BACKGROUND, True),
+    'historicals': (3.0, 6, PRIORITY_BACKGROUND, True),
+    'login': (0.2, 2, PRIORITY_ORDERS, False),
+}
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 10.0
+MAX_WAIT = 30.0
+# Set by note_response, the only place a 429 shows up (see is_empty)
+RESPONSES = threading.local()
+
+
+class BrokerUnavailable(Exception):
+    pass
+
+
+def configure_session(session, pool_size: int = POOL_SIZE, timeout: float = REQUEST_TIMEOUT) -> None:
+    """
+    Gives robin_stocks' shared session a connection pool sized for our worker threads and a default timeout;
+    its GET helpers pass none, so a stalled connection would otherwise hang the calling thread forever.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(note_response)
+    request = session.request
+
+    def request_with_timeout(method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = timeout
+        return request(method, url, **kwargs)
+    session.request = request_with_timeout
+
+
+def note_response(response, *args, **kwargs) -> None:
+    if response.status_code == 429:
+        RESPONSES.rate_limited = True
+
+
+def take_rate_limited() -> bool:
+    # Hooks run on the calling thread, so this only sees responses to this thread's own requests
+    rate_limited = getattr(RESPONSES, 'rate_limited', False)
+    RESPONSES.rate_limited = False
+    return rate_limited
+
+
+def is_rate_limited(error: Exception) -> bool:
+    if not isinstance(error, HTTPError):
+        return False
+    status = getattr(error.response, 'status_code', None)
+    return status == 429 or (status is None and '429' in str(error))
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    if isinstance(error, HTTPError):
+        status = getattr(error.response, 'status_code', None)
+        if status is None:
+            return '429' in str(error) or str(error)[:1] == '5'
+        return status == 429 or status >= 500
+    return False
+
+
+def is_empty(result) -> bool:
+    # robin_stocks catches HTTP errors, prints them and hands back None or [None], so a failed call only shows
+    # up as an empty result, and a 429 only in the session's response hook
+    return result is None or result == [None]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.base_burst = burst
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, needed: float) -> float:
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def scale(self, share: float) -> None:
+        self.rate = self.base_rate * share
+        self.burst = max(1.0, self.base_burst * share)
+        self.tokens = min(self.tokens, self.burst)
+
+
+class RateLimiter:
+    def __init__(self, endpoints: dict = ENDPOINTS, global_budget: tuple = GLOBAL_BUDGET,
+                 lane_reserve: dict = LANE_RESERVE):
+        self.buckets = {name: TokenBucket(rate, burst) for name, (rate, burst, _, _) in endpoints.items()}
+        self.global_bucket = TokenBucket(*global_budget)
+        self.base_reserve = dict(lane_reserve)
+        self.lane_reserve = dict(lane_reserve)
+        self.condition = threading.Condition()
+
+    def acquire(self, endpoint: str, priority: int, timeout: float = MAX_WAIT) -> float:
+        """
+        Blocks until both the endpoint's and the global bucket allow a call; returns the seconds waited.
+        """
+        bucket = self.buckets[endpoint]
+        reserve = self.lane_reserve.get(priority, 0)
+        started = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                bucket.refill(now)
+                self.global_bucket.refill(now)
+                delay = max(bucket.wait_time(1), self.global_bucket.wait_time(1 + reserve))
+                if delay == 0.0:
+                    bucket.tokens -= 1
+                    self.global_bucket.tokens -= 1
+                    return now - started
+                if now + delay - started > timeout:
+                    raise BrokerUnavailable(f'{endpoint} rate budget exhausted for {timeout:.0f}s')
+                self.condition.wait(delay)
+
+    def scale(self, share: float) -> None:
+        # Processes sharing one account split its budget instead of each spending all of it
+        with self.condition:
+            now = time.monotonic()
+            for bucket in list(self.buckets.values()) + [self.global_bucket]:
+                bucket.refill(now)
+                bucket.scale(share)
+            self.lane_reserve = {lane: reserve * share for lane, reserve in self.base_reserve.items()}
+            self.condition.notify_all()
+
+    def throttled(self) -> None:
+        # The broker pushed back, so every lane waits for the global bucket to refill instead of piling on
+        with self.condition:
+            self.global_bucket.refill(time.monotonic())
+            self.global_bucket.tokens = min(self.global_bucket.tokens, 0.0)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_call(self) -> None:
+        with self.lock:
+            state = self.state
+            if state == 'open' or (state == 'half_open' and self.trial_running):
+                raise BrokerUnavailable('circuit open')
+            if state == 'half_open':
+                # Exactly one caller probes the broker; everyone else keeps failing fast until it reports back
+                self.trial_running = True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def cancel_trial(self) -> None:
+        # The probe never reached the broker, so let the next caller probe instead
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.waited = 0.0
+
+
+class BrokerClient:
+    def __init__(self, endpoints: dict = ENDPOINTS, limiter: RateLimiter = None, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP):
+        self.endpoints = endpoints
+        self.limiter = limiter or RateLimiter(endpoints)
+        self.breakers = {name: CircuitBreaker() for name in endpoints}
+        self.endpoint_stats = {name: EndpointStats() for name in endpoints}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.share = 1.0
+        self.lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter keeps threads that failed together from retrying together
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(self, endpoint: str, function, *args, **kwargs):
+        """
+        Calls the broker through the endpoint's rate budget, priority lane and circuit breaker.
+
+        Idempotent reads are retried with jittered backoff on connection errors, 429s, 5xx and empty results
+        (see is_empty). Order placement is never retried once sent, since a lost response may still have placed
+        the order.
+        """
+        _, _, priority, idempotent = self.endpoints[endpoint]
+        breaker = self.breakers[endpoint]
+        stats = self.endpoint_stats[endpoint]
+        attempts = self.max_retries + 1 if idempotent else 1
+        result = None
+        for attempt in range(attempts):
+            try:
+                breaker.before_call()
+            except BrokerUnavailable:
+                with self.lock:
+                    stats.rejected += 1
+                raise
+            try:
+                waited = self.limiter.acquire(endpoint, priority)
+            except BaseException:
+                breaker.cancel_trial()
+                raise
+            with self.lock:
+                stats.calls += 1
+                stats.waited += waited
+                stats.retries += 1 if attempt else 0
+            take_rate_limited()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                rate_limited = take_rate_limited() or is_rate_limited(e)
+                if rate_limited:
+                    self._throttled(breaker, stats)
+                else:
+                    breaker.record_failure()
+                    with self.lock:
+                        stats.failures += 1
+                if not idempotent or not (rate_limited or is_retryable(e)) or attempt == attempts - 1:
+                    raise
+            else:
+                if take_rate_limited():
+                    self._throttled(breaker, stats)
+                    if not idempotent:
+                        return result
+                elif not (idempotent and is_empty(result)):
+                    breaker.record_success()
+                    return result
+                else:
+                    breaker.record_failure()
+                    with self.lock:
+                        stats.failures += 1
+            if attempt < attempts - 1:
+                time.sleep(self.backoff(attempt))
+        # Out of retries on empty responses: hand back what robin_stocks returned, as before
+        return result
+
+    def set_share(self, share: float) -> None:
+        self.share = share
+        self.limiter.scale(share)
+
+    def _throttled(self, breaker: CircuitBreaker, stats: EndpointStats) -> None:
+        # Backpressure, not an outage: slow everyone down without tripping the breaker
+        self.limiter.throttled()
+        breaker.record_success()
+        with self.lock:
+            stats.throttled += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {name: {'calls': stats.calls, 'retries': stats.retries, 'failures': stats.failures,
+                           'throttled': stats.throttled, 'rejected': stats.rejected, 'waited': stats.waited,
+                           'circuit': self.breakers[name].state}
+                    for name, stats in self.endpoint_stats.items()}
+
+    def flat_stats(self) -> dict:
+        stats = {f'{name}_{key}': value for name, values in self.stats().items()
+                 for key, value in values.items() if key != 'circuit'}
+        stats['budget_share'] = self.share
+        return stats
+
+
+CLIENT = BrokerClient()
+
+
+def broker_request(endpoint: str, function, *args, **kwargs):
+    return CLIENT.call(endpoint, function, *args, **kwargs)
@@ -0,0 +1,244 @@
+from backend.broker import r
+import io
+import os
+import threading
+import time
+import numpy as np
+from backend.metrics import broker_call
+from backend.broker_client import broker_request
+
+CANDLES_DIR = './candles'
+PRICE_FIELDS = ['open_price', 'close_price', 'high_price', 'low_price', 'volume']
+COLUMNS = ['begins_at'] + PRICE_FIELDS
+INTERVAL_SECONDS = {'15second': 15, '5minute': 300, '10minute': 600,
+                    'hour': 3600, 'day': 86400, 'week': 604800}
+SPAN_SECONDS = {'hour': 3600, 'day': 86400, 'week': 604800, 'month': 30 * 86400,
+                '3month': 90 * 86400, 'year': 365 * 86400, '5year': 5 * 365 * 86400}
+# Spans Robinhood accepts for each interval, smallest first; used to fetch just the missing tail
+FETCH_SPANS = {'15second': ['hour', 'day'], '5minute': ['day', 'week'], '10minute': ['day', 'week'],
+               'hour': ['week', 'month', '3month'], 'day': ['year', '5year'], 'week': ['5year']}
+# Closed candles kept per interval: enough for the longest span fetched for it, nothing older
+RETENTION = {interval: SPAN_SECONDS[spans[-1]] for interval, spans in FETCH_SPANS.items()}
+WARM_UP_PAIRS = [('15second', 'hour'), ('5minute', 'day'),
+                 ('hour', 'week'), ('day', 'year')]
+MAX_OPEN_CANDLE_AGE = 15
+
+
+@broker_call('fetch_historicals')
+def fetch_historicals(crypto: str, interval: str, span: str) -> list:
+    return broker_request('historicals', r.crypto.get_crypto_historicals, symbol=crypto, interval=interval, span=span)
+
+
+def empty_candles() -> dict:
+    candles = {'begins_at': np.empty(0, dtype=np.int64)}
+    for field in PRICE_FIELDS:
+        candles[field] = np.empty(0, dtype=np.float64)
+    return candles
+
+
+def parse_candles(data: list) -> dict:
+    if not data or data[0] is None:
+        raise ValueError('No historical data returned')
+    # begins_at looks like 2024-05-13T14:00:00Z; numpy parses it without the Z
+    candles = {'begins_at': np.array([item['begins_at'][:19] for item in data],
+                                     dtype='datetime64[s]').astype(np.int64)}
+    for field in PRICE_FIELDS:
+        candles[field] = np.array([item[field] for item in data], dtype=np.float64)
+    return candles
+
+
+def from_payload(payload) -> dict:
+    # Accepts either the record list or the compact column format served by /get-crypto-graph
+    if isinstance(payload, dict):
+        candles = {'begins_at': np.asarray(payload['begins_at'], dtype=np.int64)}
+        for field in PRICE_FIELDS:
+            candles[field] = np.asarray(payload.get(field, []), dtype=np.float64)
+        return candles
+    return parse_candles(payload)
+
+
+def take(candles: dict, selector) -> dict:
+    return {column: values[selector] for column, values in candles.items()}
+
+
+def concat(first: dict, second: dict) -> dict:
+    return {column: np.concatenate([first[column], second[column]]) for column in COLUMNS}
+
+
+def merge(existing: dict, new: dict) -> dict:
+    # Stable sort keeps existing rows ahead of new ones with the same begins_at; keep the newest
+    combined = concat(existing, new)
+    order = np.argsort(combined['begins_at'], kind='stable')
+    combined = take(combined, order)
+    begins_at = combined['begins_at']
+    keep = np.ones(len(begins_at), dtype=bool)
+    keep[:-1] = begins_at[:-1] != begins_at[1:]
+    return take(combined, keep)
+
+
+def to_records(candles: dict, crypto: str) -> list:
+    begins_at = np.datetime_as_string(
+        candles['begins_at'].astype('datetime64[s]'), unit='s')
+    columns = [candles[field].tolist() for field in PRICE_FIELDS]
+    records = []
+    for index, timestamp in enumerate(begins_at):
+        record = {'begins_at': timestamp + 'Z'}
+        for field, values in zip(PRICE_FIELDS, columns):
+            record[field] = str(values[index])
+        record['session'] = 'reg'
+        record['interpolated'] = False
+        record['symbol'] = crypto
+        records.append(record)
+    return records
+
+
+class CandleSeries:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.closed = empty_candles()
+        self.open = empty_candles()
+        self.complete_from = None
+        self.fetched_at = 0.0
+        self.loaded = False
+
+    def load(self) -> None:
+        if self.loaded:
+            return
+        if os.path.exists(self.path):
+            with np.load(self.path) as stored:
+                self.closed = {column: stored[column] for column in COLUMNS}
+                self.complete_from = int(stored['complete_from'])
+        self.loaded = True
+
+    def save(self) -> None:
+        buf = io.BytesIO()
+        np.savez(buf, complete_from=np.int64(self.complete_from), **self.closed)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(buf.getvalue())
+        os.replace(tmp_path, self.path)
+
+    def trim(self, cutoff: int) -> None:
+        start = int(np.searchsorted(self.closed['begins_at'], cutoff))
+        if start:
+            self.closed = take(self.closed, slice(start, None))
+            self.complete_from = max(self.complete_from, cutoff)
+
+    def since(self, start: int) -> dict:
+        return take(self.closed, slice(int(np.searchsorted(self.closed['begins_at'], start)), None))
+
+    def last_closed(self) -> int:
+        return int(self.closed['begins_at'][-1]) if len(self.closed['begins_at']) else None
+
+
+class CandleStore:
+    def __init__(self, directory: str = CANDLES_DIR, fetch=fetch_historicals):
+        self.directory = directory
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.series = {}
+        self.from_cache = 0
+        self.from_upstream = 0
+        self.upstream_calls = 0
+
+    def _series(self, crypto: str, interval: str) -> CandleSeries:
+        with self.lock:
+            key = (crypto, interval)
+            if key not in self.series:
+                os.makedirs(self.directory, exist_ok=True)
+                self.series[key] = CandleSeries(
+                    os.path.join(self.directory, f'{crypto}_{interval}.npz'))
+            return self.series[key]
+
+    def _fetch_span(self, series: CandleSeries, interval: str, span: str, window_start: int, now: float) -> str:
+        # Fetch the requested span when we've never covered its start, otherwise the smallest span covering the gap
+        if series.complete_from is None or window_start < series.complete_from or series.last_closed() is None:
+            return span
+        gap = now - series.last_closed()
+        for candidate in FETCH_SPANS.get(interval, []):
+            if SPAN_SECONDS[candidate] > SPAN_SECONDS[span]:
+                break
+            if SPAN_SECONDS[candidate] >= gap:
+                return candidate
+        return span
+
+    def _needs_fetch(self, series: CandleSeries, interval: str, window_start: int, now: float) -> bool:
+        if series.complete_from is None or window_start < series.complete_from or series.last_closed() is None:
+            return True
+        next_close = series.last_closed() + 2 * INTERVAL_SECONDS[interval]
+        max_open_age = min(INTERVAL_SECONDS[interval], MAX_OPEN_CANDLE_AGE)
+        return now >= next_close or now - series.fetched_at > max_open_age
+
+    def _update(self, series: CandleSeries, crypto: str, interval: str, span: str, window_start: int, now: float) -> np.ndarray:
+        fetch_span = self._fetch_span(series, interval, span, window_start, now)
+        fetched = parse_candles(self.fetch(crypto, interval, fetch_span))
+        with self.lock:
+            self.upstream_calls += 1
+        previous_last = series.last_closed()
+        previous_complete_from = series.complete_from
+        is_closed = fetched['begins_at'] + INTERVAL_SECONDS[interval] <= now
+        series.closed = merge(series.closed, take(fetched, is_closed))
+        series.open = take(fetched, ~is_closed)
+        fetched_from = int(now - SPAN_SECONDS[fetch_span])
+        # Only extend the complete range if this fetch joined up with what we already had
+        if series.complete_from is None or previous_last is None or fetched_from > previous_last:
+            series.complete_from = fetched_from
+        else:
+            series.complete_from = min(series.complete_from, fetched_from)
+        series.fetched_at = now
+        series.trim(int(now - RETENTION.get(interval, SPAN_SECONDS[span])))
+        # A refresh that only moved the open candle leaves the file as it was
+        if series.last_closed() != previous_last or series.complete_from != previous_complete_from:
+            series.save()
+        return fetched['begins_at']
+
+    def window(self, crypto: str, interval: str, span: str) -> dict:
+        if interval not in INTERVAL_SECONDS or span not in SPAN_SECONDS:
+            raise ValueError(f'Unsupported interval/span {interval}/{span}')
+        series = self._series(crypto, interval)
+        with series.lock:
+            series.load()
+            now = time.time()
+            window_start = int(now - SPAN_SECONDS[span])
+            fetched = np.empty(0, dtype=np.int64)
+            if self._needs_fetch(series, interval, window_start, now):
+                fetched = self._update(series, crypto, interval, span, window_start, now)
+            candles = merge(series.since(window_start), series.open)
+        candles = take(candles, candles['begins_at'] >= window_start)
+        upstream = int(np.isin(candles['begins_at'], fetched).sum())
+        with self.lock:
+            self.from_upstream += upstream
+            self.from_cache += len(candles['begins_at']) - upstream
+        return candles
+
+    def stored(self, crypto: str, interval: str) -> dict:
+        series = self._series(crypto, interval)
+        with series.lock:
+            series.load()
+            return series.closed
+
+    def records(self, crypto: str, interval: str, span: str) -> list:
+        return to_records(self.window(crypto, interval, span), crypto)
+
+    def warm_up(self, cryptos: list, pairs: list = WARM_UP_PAIRS) -> None:
+        for crypto in cryptos:
+            for interval, span in pairs:
+                try:
+                    self.window(crypto, interval, span)
+                except Exception as e:
+                    print(f'Candle warm-up failed for {crypto} {interval}/{span}: {e}')
+
+    def stats(self) -> dict:
+        with self.lock:
+            served = self.from_cache + self.from_upstream
+            return {
+                'from_cache': self.from_cache,
+                'from_upstream': self.from_upstream,
+                'cache_ratio': self.from_cache / served if served else 0.0,
+                'upstream_calls': self.upstream_calls,
+                'series': len(self.series),
+            }
+
+
+CANDLES = CandleStore()
@@ -0,0 +1,69 @@
+import numpy as np
+
+MAX_POINTS = 1000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks the indices of at most threshold points that keep the shape of y over x.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(y_series: list, threshold: int) -> np.ndarray:
+    """
+    Keeps the first/last points plus each bucket's minimum and maximum of every series, so extrema always survive.
+    """
+    n = len(y_series[0])
+    if threshold >= n:
+        return np.arange(n)
+    buckets = max(1, (threshold - 2) // (2 * len(y_series)))
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    indices = [np.array([0, n - 1])]
+    for y in y_series:
+        # reduceat gives each bucket's extreme value; match it back to the first index holding it
+        bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+        for reduce in (np.minimum, np.maximum):
+            extremes = reduce.reduceat(y, starts)
+            hits = np.flatnonzero(y == extremes[bucket_ids])
+            _, first = np.unique(bucket_ids[hits], return_index=True)
+            indices.append(hits[first])
+    return np.unique(np.concatenate(indices))
+
+
+def downsample(candles: dict, fields: list, threshold: int = MAX_POINTS, method: str = 'lttb') -> dict:
+    n = len(candles['begins_at'])
+    if not threshold or threshold >= n:
+        return candles
+    if method == 'minmax':
+        indices = minmax([candles[field] for field in fields], threshold)
+    else:
+        indices = lttb(candles['begins_at'], candles[fields[0]], threshold)
+    return {column: values[indices] for column, values in candles.items()}
+
+
+def to_compact(candles: dict) -> dict:
+    compact = {'begins_at': candles['begins_at'].tolist()}
+    for column, values in candles.items():
+        if column != 'begins_at':
+            compact[column] = values.tolist()
+    return compact
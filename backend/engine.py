@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from backend.robin import (execute_sell_order, get_crypto_holdings, get_crypto_quotes, hours_to_seconds,
+                           minutes_to_seconds, round_value, track_order)
+from backend.strategy import take_profit_quantity
+from backend.quotes import MAX_TRADING_AGE
+from backend.metrics import ENGINE_TICK_LAG_SECONDS, ENGINE_TICK_SECONDS
+
+POLL_INTERVAL = 2.5
+MAX_WORKERS = 4
+# A symbol whose sell the broker rejects waits this long before trying again, doubling per rejection
+PLACEMENT_BACKOFF = 30.0
+MAX_PLACEMENT_BACKOFF = 600.0
+
+
+class SymbolState:
+    def __init__(self, crypto: str, initial_value: float):
+        self.crypto = crypto
+        self.initial_value = initial_value
+        self.pending_order = None
+        self.last_price = None
+        self.last_holdings = None
+        self.evaluations = 0
+        self.errors = 0
+        self.stale_skips = 0
+        self.rounded_to_zero = 0
+        self.rejections = 0
+        self.rejected_orders = 0
+        self.retry_at = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def order_outstanding(self) -> bool:
+        return self.pending_order is not None and not self.pending_order.done.is_set()
+
+    def backing_off(self) -> bool:
+        return time.monotonic() < self.retry_at
+
+    def reject(self) -> None:
+        self.rejections += 1
+        self.rejected_orders += 1
+        self.retry_at = time.monotonic() + min(PLACEMENT_BACKOFF * 2 ** (self.rejections - 1),
+                                               MAX_PLACEMENT_BACKOFF)
+
+    def metrics(self) -> dict:
+        return {
+            'initial_value': self.initial_value,
+            'last_price': self.last_price,
+            'last_holdings': self.last_holdings,
+            'order_outstanding': self.order_outstanding(),
+            'evaluations': self.evaluations,
+            'errors': self.errors,
+            'stale_skips': self.stale_skips,
+            'rounded_to_zero': self.rounded_to_zero,
+            'rejected_orders': self.rejected_orders,
+            'backing_off': self.backing_off(),
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'avg_latency': self.total_latency / self.evaluations if self.evaluations else 0.0,
+        }
+
+
+class TradingEngine:
+    def __init__(self, cryptos: list, run_time: float, stop_signal: threading.Event = None,
+                 poll_interval: float = POLL_INTERVAL, max_workers: int = MAX_WORKERS):
+        self.cryptos = list(cryptos)
+        self.run_time = run_time
+        self.stop_signal = stop_signal if stop_signal is not None else threading.Event()
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.states = {}
+        self.ticks = 0
+        self.started_at = None
+
+    def snapshot(self) -> tuple:
+        # Symbols whose last good quote is too old to trade on are left out of prices
+        quotes = get_crypto_quotes(self.cryptos, max_stale=MAX_TRADING_AGE)
+        # Half an interval so each tick sees a snapshot refreshed for it, shared with /positions
+        holdings = get_crypto_holdings(self.poll_interval / 2)
+        prices = {crypto: float(quote['mark_price']) for crypto, quote in quotes.items()}
+        return prices, holdings
+
+    def evaluate(self, state: SymbolState, price: float, holdings: float, scheduled: float) -> None:
+        started = time.monotonic()
+        state.last_lag = started - scheduled
+        state.max_lag = max(state.max_lag, state.last_lag)
+        state.last_price = price
+        state.last_holdings = holdings
+        try:
+            # Holdings only reflect a sell once it fills, so wait for the outstanding one
+            if not state.order_outstanding() and not state.backing_off():
+                to_sell_quantity = take_profit_quantity(
+                    state.crypto, state.initial_value, price, holdings)
+                if to_sell_quantity:
+                    self.place_sell(state, to_sell_quantity, price)
+        except Exception as e:
+            state.errors += 1
+            print(f'{state.crypto} evaluation failed: {e}')
+        latency = time.monotonic() - started
+        state.evaluations += 1
+        state.last_latency = latency
+        state.max_latency = max(state.max_latency, latency)
+        state.total_latency += latency
+
+    def place_sell(self, state: SymbolState, quantity: float, price: float) -> None:
+        order_quantity = round_value(quantity)
+        # The broker rejects a sell of nothing, so don't send one
+        if order_quantity <= 0:
+            state.rounded_to_zero += 1
+            return
+        initial_data = execute_sell_order(order_quantity, state.crypto)
+        if not isinstance(initial_data, dict) or not initial_data.get('id'):
+            # Retrying every poll would place the same rejected order all session
+            state.reject()
+            print(f'{state.crypto} sell was not placed ({initial_data}), retrying after backoff')
+            return
+        state.rejections = 0
+        state.pending_order = track_order(initial_data, state.crypto, quantity, price)
+
+    def stopped(self) -> bool:
+        return self.stop_signal.is_set() or time.time() - self.started_at >= self.run_time
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        prices, holdings = self.snapshot()
+        missing = [crypto for crypto in self.cryptos if crypto not in prices]
+        if missing:
+            raise ValueError(f'No recent quote for {", ".join(missing)}')
+        self.states = {crypto: SymbolState(crypto, holdings.get(crypto, 0.0) * prices[crypto])
+                       for crypto in self.cryptos}
+
+    def pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.cryptos)),
+                                  thread_name_prefix='trading-engine')
+
+    def tick(self, pool: ThreadPoolExecutor, scheduled: float) -> None:
+        started = time.monotonic()
+        ENGINE_TICK_LAG_SECONDS.observe(started - scheduled)
+        try:
+            prices, holdings = self.snapshot()
+            futures = []
+            for crypto, state in self.states.items():
+                if crypto not in prices:
+                    state.stale_skips += 1
+                    print(f'{crypto} quote is stale, skipping evaluation')
+                    continue
+                futures.append(pool.submit(self.evaluate, state, prices[crypto], holdings.get(crypto, 0.0),
+                                           scheduled))
+            wait(futures)
+        except Exception as e:
+            print(f'Trading snapshot failed: {e}')
+        self.ticks += 1
+        ENGINE_TICK_SECONDS.observe(time.monotonic() - started)
+
+    def run(self) -> None:
+        self.start()
+        next_tick = time.monotonic()
+        with self.pool() as pool:
+            while not self.stopped():
+                self.tick(pool, next_tick)
+                # Skip ticks we've fallen behind on rather than bursting to catch up
+                next_tick = max(next_tick + self.poll_interval, time.monotonic())
+                self.stop_signal.wait(next_tick - time.monotonic())
+        print('Stopped Auto Trading Process')
+
+    def metrics(self) -> dict:
+        return {
+            'running': self.started_at is not None and not self.stopped(),
+            'ticks': self.ticks,
+            'symbols': {crypto: state.metrics() for crypto, state in self.states.items()},
+        }
+
+
+def to_seconds(run_time: float, interval: str) -> float:
+    if interval == 'minutes':
+        return minutes_to_seconds(run_time)
+    if interval == 'hours':
+        return hours_to_seconds(run_time)
+    return run_time
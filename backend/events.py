@@ -0,0 +1,93 @@
+import itertools
+import json
+import queue
+import threading
+from collections import deque
+
+SUBSCRIBER_QUEUE_SIZE = 256
+HISTORY_SIZE = 200
+HEARTBEAT_INTERVAL = 15.0
+
+
+def format_event(event_id: int, event: str, data) -> str:
+    # Snapshot events sent on connect carry no id so they don't move the client's Last-Event-ID
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class Subscription:
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+
+class EventHub:
+    """
+    Fans events out to every connected stream.
+
+    Each event is serialized once and the same text is queued for every subscriber. A subscriber whose queue
+    fills up is dropped rather than slowing publishers down; its browser reconnects and replays what it missed
+    from the recent history using Last-Event-ID.
+    """
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE, history: int = HISTORY_SIZE):
+        self.maxsize = maxsize
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event: str, data, replay: bool = True) -> None:
+        # replay=False is for ticks a newer event supersedes, so they don't crowd trades out of the history
+        with self.lock:
+            if not replay and not self.subscribers:
+                return
+            event_id = next(self.ids)
+            message = format_event(event_id, event, data)
+            if replay:
+                self.history.append((event_id, message))
+            self.published += 1
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    subscription.dropped = True
+                    self.subscribers.discard(subscription)
+                    self.dropped += 1
+
+    def subscribe(self, last_event_id: int = None) -> Subscription:
+        subscription = Subscription(self.maxsize)
+        with self.lock:
+            if last_event_id is not None:
+                for event_id, message in self.history:
+                    if event_id > last_event_id and not subscription.queue.full():
+                        subscription.queue.put_nowait(message)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def stream(self, subscription: Subscription, initial: list = (), heartbeat: float = HEARTBEAT_INTERVAL):
+        try:
+            for event, data in initial:
+                yield format_event(None, event, data)
+            while not subscription.dropped:
+                try:
+                    yield subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment lines keep proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'subscribers': len(self.subscribers), 'published': self.published,
+                    'dropped': self.dropped, 'history': len(self.history)}
+
+
+EVENTS = EventHub()
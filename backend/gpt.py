@@ -1,36 +1,71 @@
-from transformers import GPT2Tokenizer
-from openai import OpenAI
 from backend.utils import get_api_key, PROMPT
+from functools import lru_cache
 import json
-CLIENT = OpenAI(api_key=get_api_key())
-TOKENIZER = GPT2Tokenizer.from_pretrained('gpt2')
+import threading
 
+TOKEN_LIMIT = 10000
+CLIENT = None
+TOKENIZER = None
+INIT_LOCK = threading.Lock()
 
-def ask_gpt(file_content: str, crypto: str, interval: str, span: str) -> str:
-    """
-    Reads a portion of a file and asks a question in a conversational manner based on its content.
 
-    Parameters:
-    - filename: The path to the file.
-    - question: The question you want to ask about the content of the file.
+def get_client():
+    global CLIENT
+    if CLIENT is None:
+        with INIT_LOCK:
+            if CLIENT is None:
+                from openai import OpenAI
+                CLIENT = OpenAI(api_key=get_api_key())
+    return CLIENT
 
-    Returns:
-    - The answer as a string.
-    """
-    question = f"The following is information for {crypto} in the following interval (Every {interval} over the past {span})" + PROMPT
-    file_content = json.dumps(file_content)
-    token_count = len(TOKENIZER.encode(file_content + question))
-    if token_count > 10000:
-        return f"Too Many Request Tokens: {token_count}"
+
+def set_client(client) -> None:
+    # Swap in any object exposing chat.completions.create, e.g. a local stub for tests
+    global CLIENT
+    CLIENT = client
+
+
+def get_tokenizer():
+    # The standalone tokenizers package loads GPT-2's BPE without importing transformers
+    global TOKENIZER
+    if TOKENIZER is None:
+        with INIT_LOCK:
+            if TOKENIZER is None:
+                try:
+                    from tokenizers import Tokenizer
+                    TOKENIZER = Tokenizer.from_pretrained('gpt2')
+                except Exception:
+                    from transformers import GPT2TokenizerFast
+                    TOKENIZER = GPT2TokenizerFast.from_pretrained('gpt2')
+    return TOKENIZER
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    encoded = get_tokenizer().encode(text)
+    return len(encoded.ids) if hasattr(encoded, 'ids') else len(encoded)
+
+
+def warm_up() -> None:
     try:
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": f"Based on the following content:\n{file_content}\n\nQuestion: {question}"}
-        ]
-        response = CLIENT.chat.completions.create(model="gpt-4",
-                                                  messages=messages,
-                                                  max_tokens=token_count)
-        answer = response.choices[0].message.content
-        return answer.strip()
+        get_tokenizer()
+        get_client()
     except Exception as e:
-        return f"An error occurred: {e}"
+        print(f'GPT warm-up failed: {e}')
+
+
+def request_analysis(content, crypto: str, interval: str, span: str) -> str:
+    question = f"The following is information for {crypto} in the following interval (Every {interval} over the past {span})" + PROMPT
+    content = json.dumps(content)
+    token_count = count_tokens(content + question)
+    if token_count > TOKEN_LIMIT:
+        raise ValueError(f"Too Many Request Tokens: {token_count}")
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": f"Based on the following content:\n{content}\n\nQuestion: {question}"}
+    ]
+    response = get_client().chat.completions.create(model="gpt-4",
+                                                    messages=messages,
+                                                    max_tokens=token_count)
+    answer = response.choices[0].message.content
+    return answer.strip()
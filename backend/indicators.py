@@ -0,0 +1,255 @@
+import threading
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from backend.candles import CANDLES, COLUMNS, INTERVAL_SECONDS, concat, empty_candles, take
+
+SMA_PERIODS = (20, 50)
+EMA_PERIODS = (12, 26)
+RSI_PERIOD = 14
+BOLLINGER_PERIOD = 20
+BOLLINGER_WIDTH = 2.0
+VWAP_PERIOD = 20
+VOLATILITY_PERIOD = 20
+INDICATORS = tuple(f'sma_{period}' for period in SMA_PERIODS) + tuple(f'ema_{period}' for period in EMA_PERIODS) + (
+    f'rsi_{RSI_PERIOD}', 'bollinger_upper', 'bollinger_middle', 'bollinger_lower', 'vwap', 'volatility')
+# Shorthands accepted wherever indicator names are
+GROUPS = {'sma': [f'sma_{period}' for period in SMA_PERIODS], 'ema': [f'ema_{period}' for period in EMA_PERIODS],
+          'rsi': [f'rsi_{RSI_PERIOD}'], 'bollinger': ['bollinger_upper', 'bollinger_middle', 'bollinger_lower']}
+# Most history one series keeps; the smoothing state carries everything older
+MAX_HISTORY = 20000
+# Block length for the closed-form EMA, short enough that decay ** -block stays well inside float range
+EMA_BLOCK = 64
+
+
+def parse_names(names: str) -> list:
+    if not names:
+        return list(INDICATORS)
+    parsed = []
+    for name in names.split(','):
+        for expanded in GROUPS.get(name, [name]):
+            if expanded not in INDICATORS:
+                raise ValueError(f'Unknown indicator {name}')
+            if expanded not in parsed:
+                parsed.append(expanded)
+    return parsed
+
+
+def tail(values: np.ndarray, count: int) -> np.ndarray:
+    return values[len(values) - min(len(values), max(count, 0)):]
+
+
+def rolling(history: np.ndarray, new: np.ndarray, period: int, reduce) -> np.ndarray:
+    """
+    Applies reduce over every period-long window ending on a new value, reusing just the history it overlaps.
+    """
+    values = np.concatenate([tail(history, period - 1), new])
+    out = np.full(len(new), np.nan)
+    if len(values) >= period:
+        result = reduce(sliding_window_view(values, period), axis=1)
+        out[len(out) - len(result):] = result
+    return out
+
+
+def ewm(values: np.ndarray, alpha: float, previous: float) -> np.ndarray:
+    # ema[t] = decay ** (t + 1) * previous + alpha * decay ** t * cumsum(x[j] / decay ** j), a block at a time
+    decay = 1.0 - alpha
+    out = np.empty(len(values))
+    for start in range(0, len(values), EMA_BLOCK):
+        block = values[start:start + EMA_BLOCK]
+        powers = decay ** np.arange(len(block))
+        out[start:start + len(block)] = decay * powers * previous + alpha * powers * np.cumsum(block / powers)
+        previous = out[start + len(block) - 1]
+    return out
+
+
+def smoothed(history: np.ndarray, new: np.ndarray, alpha: float, period: int, previous: float) -> np.ndarray:
+    """
+    Continues an exponential average from previous, or seeds it with the mean of the first period values.
+
+    previous is NaN until period values have been seen, so the history needed to seed it is always short.
+    """
+    if not np.isnan(previous):
+        return ewm(new, alpha, previous)
+    values = np.concatenate([history, new])
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1] = values[:period].mean()
+        out[period:] = ewm(values[period:], alpha, out[period - 1])
+    return out[len(history):]
+
+
+def differences(history: np.ndarray, new: np.ndarray) -> np.ndarray:
+    # One change per new candle; the very first candle has none
+    if not len(history):
+        return np.concatenate([[np.nan], np.diff(new)]) if len(new) else new
+    return np.diff(np.concatenate([history[-1:], new]))
+
+
+def log_returns(history: np.ndarray, new: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return differences(np.log(history), np.log(new))
+
+
+class IndicatorSeries:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.candles = empty_candles()
+        self.values = {name: np.empty(0) for name in INDICATORS}
+        self.state = {'ema': {period: np.nan for period in EMA_PERIODS}, 'gain': np.nan, 'loss': np.nan}
+
+    def begins_at(self) -> np.ndarray:
+        return self.candles['begins_at']
+
+    def extend(self, new: dict) -> tuple:
+        """
+        Computes every indicator for candles following the committed ones; returns (values, state) without
+        committing, so the still-open candle can be previewed and then recomputed once it closes.
+        """
+        history = self.candles
+        close = history['close_price']
+        new_close = new['close_price']
+        values = {}
+        for period in SMA_PERIODS:
+            values[f'sma_{period}'] = rolling(close, new_close, period, np.mean)
+        state = {'ema': {}}
+        for period in EMA_PERIODS:
+            values[f'ema_{period}'] = smoothed(tail(close, period), new_close, 2.0 / (period + 1), period,
+                                               self.state['ema'][period])
+            state['ema'][period] = values[f'ema_{period}'][-1] if len(new_close) else self.state['ema'][period]
+        # Wilder's RSI: gains and losses smoothed with alpha = 1 / period, starting from the first full period
+        changes = differences(close, new_close)
+        history_changes = np.diff(tail(close, RSI_PERIOD + 1))
+        gains = [np.clip(change, 0, None) for change in (history_changes, changes)]
+        losses = [np.clip(-change, 0, None) for change in (history_changes, changes)]
+        # The first candle's change is NaN; leave it out of the seed so the series starts a candle later
+        gains = [part[~np.isnan(part)] for part in gains]
+        losses = [part[~np.isnan(part)] for part in losses]
+        average_gain = smoothed(gains[0], gains[1], 1.0 / RSI_PERIOD, RSI_PERIOD, self.state['gain'])
+        average_loss = smoothed(losses[0], losses[1], 1.0 / RSI_PERIOD, RSI_PERIOD, self.state['loss'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(average_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + average_gain / average_loss))
+        rsi[np.isnan(average_gain)] = np.nan
+        values[f'rsi_{RSI_PERIOD}'] = np.concatenate([np.full(len(new_close) - len(rsi), np.nan), rsi])
+        state['gain'] = average_gain[-1] if len(average_gain) else self.state['gain']
+        state['loss'] = average_loss[-1] if len(average_loss) else self.state['loss']
+        middle = rolling(close, new_close, BOLLINGER_PERIOD, np.mean)
+        width = BOLLINGER_WIDTH * rolling(close, new_close, BOLLINGER_PERIOD, np.std)
+        values['bollinger_middle'] = middle
+        values['bollinger_upper'] = middle + width
+        values['bollinger_lower'] = middle - width
+        recent = {column: tail(column_values, VWAP_PERIOD - 1) for column, column_values in history.items()}
+        typical = (recent['high_price'] + recent['low_price'] + recent['close_price']) / 3
+        new_typical = (new['high_price'] + new['low_price'] + new_close) / 3
+        volume = rolling(recent['volume'], new['volume'], VWAP_PERIOD, np.sum)
+        traded = rolling(typical * recent['volume'], new_typical * new['volume'], VWAP_PERIOD, np.sum)
+        # Crypto historicals often report zero volume; fall back to the plain typical-price average
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values['vwap'] = np.where(volume > 0, traded / volume,
+                                      rolling(typical, new_typical, VWAP_PERIOD, np.mean))
+        returns = log_returns(tail(close, VOLATILITY_PERIOD + 1), new_close)
+        history_returns = np.diff(np.log(tail(close, VOLATILITY_PERIOD + 1)))
+        values['volatility'] = rolling(history_returns, returns, VOLATILITY_PERIOD, np.std) * 100
+        return values, state
+
+    def commit(self, new: dict, values: dict, state: dict) -> None:
+        self.candles = concat(self.candles, new)
+        self.values = {name: np.concatenate([self.values[name], values[name]]) for name in INDICATORS}
+        self.state = state
+        if len(self.candles['begins_at']) > MAX_HISTORY:
+            self.candles = {column: column_values[-MAX_HISTORY:] for column, column_values in self.candles.items()}
+            self.values = {name: series[-MAX_HISTORY:] for name, series in self.values.items()}
+
+
+class IndicatorEngine:
+    """
+    Keeps indicators for each (symbol, interval) computed over the closed candles seen so far, so a request
+    only computes the candles that closed since the last one plus a preview of the open candle.
+    """
+
+    def __init__(self, candles=CANDLES):
+        self.candles = candles
+        self.series = {}
+        self.lock = threading.Lock()
+        self.incremental = 0
+        self.recomputed = 0
+        self.rebuilds = 0
+
+    def _series(self, crypto: str, interval: str) -> IndicatorSeries:
+        with self.lock:
+            return self.series.setdefault((crypto, interval), IndicatorSeries())
+
+    def compute(self, crypto: str, interval: str, candles: dict, names: list = INDICATORS, now: float = None) -> dict:
+        """
+        Returns {name: values} aligned with candles.
+        """
+        now = time.time() if now is None else now
+        begins_at = candles['begins_at']
+        is_closed = begins_at + INTERVAL_SECONDS[interval] <= now
+        closed = take(candles, is_closed)
+        series = self._series(crypto, interval)
+        with series.lock:
+            known = series.begins_at()
+            positions = np.searchsorted(known, closed['begins_at'])
+            seen = positions < len(known)
+            seen[seen] = known[positions[seen]] == closed['begins_at'][seen]
+            fresh = closed['begins_at'] > (known[-1] if len(known) else -1)
+            # Anything older than what we hold, or a window that no longer joins up with it, starts over
+            if not (seen | fresh).all() or (len(known) and len(closed['begins_at']) and not seen.any()):
+                series.reset()
+                fresh = np.ones(len(closed['begins_at']), dtype=bool)
+                with self.lock:
+                    self.rebuilds += 1
+            appended = take(closed, fresh)
+            if len(appended['begins_at']):
+                values, state = series.extend(appended)
+                series.commit(appended, values, state)
+            with self.lock:
+                self.incremental += len(appended['begins_at'])
+            opened = take(candles, ~is_closed)
+            preview, _ = series.extend(opened)
+            with self.lock:
+                self.recomputed += len(opened['begins_at'])
+            known = series.begins_at()
+            positions = np.searchsorted(known, closed['begins_at'])
+            return {name: np.concatenate([series.values[name][positions], preview[name]]) for name in names}
+
+    def window(self, crypto: str, interval: str, span: str, names: list = INDICATORS) -> tuple:
+        """
+        Returns (candles, indicators) for the same window /get-crypto-graph serves.
+        """
+        candles = self.candles.window(crypto, interval, span)
+        return candles, self.compute(crypto, interval, candles, names)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'series': len(self.series), 'incremental': self.incremental,
+                    'recomputed': self.recomputed, 'rebuilds': self.rebuilds}
+
+
+INDICATOR_ENGINE = IndicatorEngine()
+
+
+def latest_values(values: dict) -> dict:
+    latest = {}
+    for name, series in values.items():
+        known = series[~np.isnan(series)]
+        latest[name] = float(known[-1]) if len(known) else None
+    return latest
+
+
+def compute_indicators(candles: dict) -> dict:
+    """
+    One-off computation over a candle payload, for callers without a (symbol, interval) to cache under.
+    """
+    series = IndicatorSeries()
+    values, _ = series.extend({column: candles[column] for column in COLUMNS})
+    return values
+
+
+def to_json(values: dict) -> dict:
+    # JSON has no NaN; indicators still warming up come back as null
+    return {name: [None if np.isnan(value) else value for value in series.tolist()] for name, series in values.items()}
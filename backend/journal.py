@@ -0,0 +1,320 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+JOURNAL_DIR = './orders'
+JOURNAL_FILE = 'journal.log'
+SNAPSHOT_FILE = 'snapshot.json'
+LOCK_FILE = 'journal.lock'
+# Events arriving within one flush window share a single fsync
+FLUSH_INTERVAL = 0.02
+COMPACT_EVERY = 1000
+FINISHED_RETENTION = 7 * 86400
+PENDING = 'pending'
+
+
+class JournalLockedError(Exception):
+    pass
+
+
+def fsync_directory(directory: str) -> None:
+    # Makes a rename durable; not every platform lets a directory be opened
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def order_value(record: dict, data: dict) -> float:
+    quantity = float(data.get('cumulative_quantity') or record.get('quantity') or 0)
+    price = float(data.get('average_price') or data.get('price') or record.get('price') or 0)
+    return quantity * price
+
+
+class OrderJournal:
+    """
+    Write-ahead journal of order events: one JSON line per event, appended by a single writer thread that
+    fsyncs each batch once. Every few thousand events the state is compacted into a snapshot and the log
+    restarts, so replay on startup only reads what happened since.
+    """
+
+    def __init__(self, directory: str = JOURNAL_DIR, flush_interval: float = FLUSH_INTERVAL,
+                 compact_every: int = COMPACT_EVERY, retention: float = FINISHED_RETENTION):
+        self.directory = directory
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.lock_path = os.path.join(directory, LOCK_FILE)
+        self.lock_file = None
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.retention = retention
+        self.sink = None
+        self.orders = {}
+        self.totals = {'buy': 0.0, 'sell': 0.0, 'fills': 0}
+        self.last_fill_at = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.since_snapshot = 0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.file = None
+        self.thread = None
+        self.appended = 0
+        self.batches = 0
+        self.compactions = 0
+        self.replayed = 0
+        self.torn = 0
+        self.replay_seconds = 0.0
+
+    def set_sink(self, sink) -> None:
+        # Session worker processes forward events to the server process, which owns the files
+        self.sink = sink
+
+    def open(self) -> list:
+        """
+        Loads the snapshot, replays the journal after it and starts the writer; returns the orders still pending.
+        """
+        with self.lock:
+            if self.file is None:
+                started = time.perf_counter()
+                os.makedirs(self.directory, exist_ok=True)
+                self._acquire_lock()
+                self._load_snapshot()
+                self._replay()
+                self.file = open(self.journal_path, 'a', encoding='utf-8')
+                self.replay_seconds = time.perf_counter() - started
+                self.thread = threading.Thread(target=self._run, name='order-journal', daemon=True)
+                self.thread.start()
+        return self.pending()
+
+    def _acquire_lock(self) -> None:
+        # Two writers would interleave seqs and truncate each other's lines on compaction
+        if fcntl is None:
+            return
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise JournalLockedError(f'{self.directory} is already journaled by another process')
+        self.lock_file = lock_file
+
+    def _load_snapshot(self) -> None:
+        if not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+            snapshot = json.load(file)
+        self.orders = snapshot['orders']
+        self.totals = snapshot['totals']
+        self.last_fill_at = snapshot['last_fill_at']
+        self.seq = self.snapshot_seq = snapshot['seq']
+
+    def _replay(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        good = 0
+        with open(self.journal_path, 'rb') as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves at most one torn line at the end; drop it
+                    self.torn += 1
+                    break
+                good += len(line)
+                if event['seq'] > self.seq:
+                    self._apply(event)
+                    self.seq = event['seq']
+                    self.since_snapshot += 1
+                    self.replayed += 1
+        if good != os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as file:
+                file.truncate(good)
+
+    def _apply(self, event: dict) -> None:
+        order_id = event['id']
+        if event['event'] == 'placed':
+            record = self.orders.get(order_id, {})
+            self.orders[order_id] = {
+                'id': order_id,
+                'account': event.get('account'),
+                'crypto': event['crypto'],
+                'type': event['type'],
+                'quantity': event['quantity'],
+                'price': event['price'],
+                'status': record.get('status', PENDING),
+                'state': event.get('state'),
+                'value': record.get('value'),
+                'placed_at': record.get('placed_at', event['at']),
+                'updated_at': event['at'],
+            }
+            return
+        record = self.orders.get(order_id)
+        if record is None or record['status'] == event['status']:
+            return
+        record['status'] = event['status']
+        record['state'] = event.get('state')
+        record['updated_at'] = event['at']
+        if event['status'] == 'filled':
+            record['value'] = order_value(record, event)
+            self.totals[record['type']] = self.totals.get(record['type'], 0.0) + record['value']
+            self.totals['fills'] += 1
+            self.last_fill_at = event['at']
+
+    def append(self, event: dict) -> Future:
+        """
+        Applies an event and queues it for the writer; the future resolves once it has been fsynced.
+        """
+        if self.sink is not None:
+            return self.sink(event)
+        if self.file is None:
+            self.open()
+        future = Future()
+        with self.lock:
+            self.seq += 1
+            event = dict(event, seq=self.seq, at=event.get('at') or time.time())
+            self._apply(event)
+            # Queued under the lock so lines reach the file in seq order
+            self.queue.put((json.dumps(event, separators=(',', ':')) + '\n', future))
+        return future
+
+    def placed(self, order_id: str, details: dict, data: dict) -> Future:
+        return self.append(dict(details, event='placed', id=order_id, state=data.get('state')))
+
+    def finished(self, order_id: str, status: str, data: dict) -> Future:
+        return self.append({'event': 'status', 'id': order_id, 'status': status, 'state': data.get('state'),
+                            'cumulative_quantity': data.get('cumulative_quantity'),
+                            'average_price': data.get('average_price'), 'price': data.get('price')})
+
+    def _next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.file.write(''.join(line for line, _ in batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except Exception as e:
+            print(f'Failed to journal {len(batch)} order events: {e}')
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        written = sum(1 for line, _ in batch if line)
+        self.appended += written
+        self.batches += 1
+        self.since_snapshot += written
+        for _, future in batch:
+            future.set_result(None)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            closing = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                self._write(batch)
+            if closing:
+                return
+            if self.since_snapshot >= self.compact_every:
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f'Order journal compaction failed: {e}')
+
+    def compact(self) -> None:
+        """
+        Writes the current state to a snapshot and restarts the journal after it. Events are applied to the
+        state when appended, so the snapshot also covers events still queued for the writer; their lines land
+        in the new journal with a seq the snapshot already has, and replay skips them.
+        """
+        with self.lock:
+            cutoff = time.time() - self.retention
+            orders = {order_id: dict(record) for order_id, record in self.orders.items()
+                      if record['status'] == PENDING or record['updated_at'] >= cutoff}
+            self.orders = orders
+            snapshot = {'seq': self.seq, 'orders': orders, 'totals': dict(self.totals),
+                        'last_fill_at': self.last_fill_at}
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        fsync_directory(self.directory)
+        # A crash from here on replays the old journal, skipping every seq the snapshot already has
+        self.file.close()
+        self.file = open(self.journal_path, 'w', encoding='utf-8')
+        self.snapshot_seq = snapshot['seq']
+        self.since_snapshot = 0
+        self.compactions += 1
+
+    def flush(self, timeout: float = None) -> None:
+        # An empty line resolves once everything queued ahead of it is on disk
+        if self.file is None:
+            return
+        future = Future()
+        self.queue.put(('', future))
+        future.result(timeout)
+
+    def close(self) -> None:
+        """
+        Writes out everything queued, stops the writer and releases the directory for another journal.
+        """
+        if self.file is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        with self.lock:
+            self.file.close()
+            self.file = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+
+    def pending(self) -> list:
+        with self.lock:
+            return [dict(record) for record in self.orders.values() if record['status'] == PENDING]
+
+    def get(self, order_id: str) -> dict:
+        with self.lock:
+            record = self.orders.get(order_id)
+            return dict(record) if record is not None else None
+
+    def summary(self) -> dict:
+        # Replaces the running total re-summed from orders/log.csv and the last sale from orders/time.txt.
+        # Values are at the broker's fill price; /todays-change prices trades where the engine decided on them
+        with self.lock:
+            return {'sold_at_fill_price': self.totals.get('sell', 0.0),
+                    'bought_at_fill_price': self.totals.get('buy', 0.0),
+                    'fills': self.totals['fills'], 'last_fill_at': self.last_fill_at,
+                    'pending': sum(record['status'] == PENDING for record in self.orders.values())}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'seq': self.seq, 'orders': len(self.orders), 'queued': self.queue.qsize(),
+                    'appended': self.appended, 'batches': self.batches, 'compactions': self.compactions,
+                    'since_snapshot': self.since_snapshot, 'replayed': self.replayed, 'torn': self.torn,
+                    'replay_seconds': self.replay_seconds}
+
+
+JOURNAL = OrderJournal()
@@ -0,0 +1,158 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get('TRADING_METRICS', '0') == '1'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FILL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0, 30.0, 60.0)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{str(value)}"' for name, value in labels) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> list:
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Per-bucket counts plus the running sum; made cumulative only when scraped
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> list:
+        samples = []
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((self.name + '_bucket', key + (('le', le),), cumulative))
+            samples.append((self.name + '_sum', key, counts[-1]))
+            samples.append((self.name + '_count', key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def _register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def collector(self, prefix: str, stats) -> None:
+        """
+        Exposes every numeric value of a component's stats() dict as a gauge named <prefix>_<key>,
+        read only when /metrics is scraped.
+        """
+        with self.lock:
+            self.collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for prefix, stats in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f'Metrics collector {prefix} failed: {e}')
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f'# TYPE {prefix}_{key} gauge')
+                lines.append(f'{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Registry()
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    'http_request_seconds', 'Endpoint latency by route, method and status')
+BROKER_CALL_SECONDS = METRICS.histogram(
+    'broker_call_seconds', 'Upstream broker call latency by function')
+BROKER_CALL_ERRORS = METRICS.counter(
+    'broker_call_errors_total', 'Upstream broker calls that raised, by function')
+ENGINE_TICK_SECONDS = METRICS.histogram(
+    'engine_tick_seconds', 'Time for one trading engine iteration across all symbols')
+ENGINE_TICK_LAG_SECONDS = METRICS.histogram(
+    'engine_tick_lag_seconds', 'How late a trading engine iteration started against its schedule')
+ORDER_FILL_SECONDS = METRICS.histogram(
+    'order_fill_seconds', 'Time from placing an order to its final status', FILL_BUCKETS)
+
+
+def broker_call(name: str):
+    # Returns the function untouched when metrics are off, so disabled instrumentation costs nothing
+    def decorator(function):
+        if not METRICS_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                BROKER_CALL_ERRORS.inc(function=name)
+                raise
+            finally:
+                BROKER_CALL_SECONDS.observe(time.perf_counter() - started, function=name)
+        return wrapper
+    return decorator
@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.metrics import ORDER_FILL_SECONDS
+
+# Seconds to wait before each successive order check: fast while fills are likely, slower after
+BACKOFF_SCHEDULE = [0.5, 0.5, 1, 1, 2, 2, 3, 5, 5, 10]
+FILL_TIMEOUT = 30
+FINISHED_RETENTION = 3600
+FAILED_STATES = {'cancelled', 'canceled', 'rejected', 'failed'}
+JOURNAL_TIMEOUT = 5.0
+RECOVERY_WORKERS = 8
+
+
+class OrderHandle:
+    def __init__(self, order_data: dict, on_update=None):
+        self.id = order_data['id']
+        self.data = order_data
+        self.status = 'pending'
+        self.on_update = on_update
+        self.placed_at = time.time()
+        self.finished_at = None
+        self.checks = 0
+        self.done = threading.Event()
+
+    def wait(self, timeout: float = None) -> str:
+        self.done.wait(timeout)
+        return self.status
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'state': self.data.get('state'),
+            'placed_at': self.placed_at,
+            'finished_at': self.finished_at,
+            'checks': self.checks,
+        }
+
+
+class OrderTracker:
+    def __init__(self, fetch_order, schedule: list = BACKOFF_SCHEDULE, timeout: float = FILL_TIMEOUT, journal=None):
+        self.fetch_order = fetch_order
+        self.journal = journal
+        self.schedule = schedule
+        self.timeout = timeout
+        self.handles = {}
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def _ensure_worker(self) -> None:
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name='order-tracker', daemon=True)
+            self.thread.start()
+
+    def _schedule(self, handle: OrderHandle) -> None:
+        delay = self.schedule[min(handle.checks, len(self.schedule) - 1)]
+        due = min(time.time() + delay, handle.placed_at + self.timeout)
+        heapq.heappush(self.queue, (due, next(self.counter), handle))
+        self.condition.notify()
+
+    def track(self, order_data: dict, on_update=None, details: dict = None) -> OrderHandle:
+        """
+        Polls a placed order until it settles. details (crypto, type, quantity, price) go to the journal so a
+        restart can still settle the order. In the server process the entry is fsynced before tracking starts;
+        session workers only hand it to the server process, which journals it when the message arrives.
+        """
+        handle = OrderHandle(order_data, on_update)
+        if self.journal is not None and details is not None:
+            try:
+                self.journal.placed(handle.id, details, order_data).result(JOURNAL_TIMEOUT)
+            except Exception as e:
+                print(f'Order {handle.id} could not be journaled: {e}')
+        self._emit(handle, 'pending')
+        with self.condition:
+            self.handles[handle.id] = handle
+            self._schedule(handle)
+            self._ensure_worker()
+        return handle
+
+    def get(self, order_id: str) -> OrderHandle:
+        with self.condition:
+            return self.handles.get(order_id)
+
+    def outstanding(self) -> list:
+        with self.condition:
+            return [handle for handle in self.handles.values() if not handle.done.is_set()]
+
+    def _emit(self, handle: OrderHandle, status: str) -> None:
+        if handle.on_update is None:
+            return
+        try:
+            handle.on_update(status, handle.data)
+        except Exception as e:
+            print(f'Order {handle.id} update callback failed: {e}')
+
+    def _finish(self, handle: OrderHandle, status: str) -> None:
+        handle.status = status
+        handle.finished_at = time.time()
+        ORDER_FILL_SECONDS.observe(handle.finished_at - handle.placed_at, status=status)
+        if self.journal is not None:
+            self.journal.finished(handle.id, status, handle.data)
+        self._emit(handle, status)
+        handle.done.set()
+
+    def _lookup(self, order_id: str) -> dict:
+        try:
+            return self.fetch_order(order_id)
+        except Exception as e:
+            print(f'Order {order_id} lookup failed: {e}')
+            return None
+
+    def reconcile(self, records: list, callback_for, workers: int = RECOVERY_WORKERS, lookup=None) -> dict:
+        """
+        Settles orders a previous process left pending. All of them are looked up at once; the ones the broker
+        has settled are finished, the rest are tracked again. callback_for(record) builds each on_update.
+
+        lookup(order_id) stands in for fetch_order on orders placed under another login; those still open are
+        left pending rather than tracked with the wrong one.
+        """
+        counts = {'filled': 0, 'failed': 0, 'resumed': 0, 'unresolved': 0}
+        if not records:
+            return counts
+        with ThreadPoolExecutor(max_workers=min(workers, len(records)), thread_name_prefix='order-recovery') as pool:
+            results = list(pool.map(lookup or self._lookup, [record['id'] for record in records]))
+        for record, data in zip(records, results):
+            if not data or data.get('id') != record['id']:
+                counts['unresolved'] += 1
+                continue
+            state = data.get('state')
+            if state != 'filled' and state not in FAILED_STATES:
+                if lookup is not None:
+                    counts['unresolved'] += 1
+                    continue
+                self.track(data, callback_for(record))
+                counts['resumed'] += 1
+                continue
+            handle = OrderHandle(data, callback_for(record))
+            handle.placed_at = record.get('placed_at') or handle.placed_at
+            with self.condition:
+                self.handles[handle.id] = handle
+            status = 'filled' if state == 'filled' else 'failed'
+            self._finish(handle, status)
+            counts[status] += 1
+        return counts
+
+    def _prune(self) -> None:
+        cutoff = time.time() - FINISHED_RETENTION
+        for order_id in [order_id for order_id, handle in self.handles.items()
+                         if handle.finished_at is not None and handle.finished_at < cutoff]:
+            del self.handles[order_id]
+
+    def _check(self, handle: OrderHandle) -> None:
+        handle.checks += 1
+        try:
+            data = self.fetch_order(handle.id)
+            # An empty result is a failed lookup (see broker_client.is_empty); keep what we had and check again
+            if data:
+                handle.data = data
+            else:
+                print(f'Order {handle.id} check returned nothing')
+        except Exception as e:
+            print(f'Order {handle.id} check failed: {e}')
+        state = handle.data.get('state')
+        if state == 'filled':
+            self._finish(handle, 'filled')
+        elif state in FAILED_STATES or time.time() >= handle.placed_at + self.timeout:
+            self._finish(handle, 'failed')
+        else:
+            with self.condition:
+                self._schedule(handle)
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.queue or self.queue[0][0] > time.time():
+                    self.condition.wait(
+                        self.queue[0][0] - time.time() if self.queue else None)
+                _, _, handle = heapq.heappop(self.queue)
+                self._prune()
+            try:
+                self._check(handle)
+            except Exception as e:
+                # One bad check must not kill the tracker or strand the order
+                print(f'Order {handle.id} check raised: {e}')
+                if handle.done.is_set():
+                    continue
+                if time.time() >= handle.placed_at + self.timeout:
+                    self._finish(handle, 'failed')
+                else:
+                    with self.condition:
+                        self._schedule(handle)
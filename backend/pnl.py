@@ -0,0 +1,63 @@
+import threading
+from datetime import datetime
+
+
+def trade_gain(trade: dict) -> float:
+    gain = float(trade['amount']) * float(trade['price'][1:])
+    return gain if trade['type'] == 'sell' else -gain
+
+
+def trade_day(trade: dict) -> str:
+    return datetime.fromtimestamp(trade['created_at']).strftime('%Y-%m-%d')
+
+
+class PnLAggregates:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = 0.0
+        self.by_crypto = {}
+        self.by_day = {}
+        self.filled_count = 0
+
+    def _add(self, trade: dict, sign: int) -> None:
+        gain = sign * trade_gain(trade)
+        day = trade_day(trade)
+        self.total += gain
+        self.by_crypto[trade['crypto']] = self.by_crypto.get(
+            trade['crypto'], 0.0) + gain
+        self.by_day[day] = self.by_day.get(day, 0.0) + gain
+        self.filled_count += sign
+
+    def record_transition(self, trade: dict, previous_status: str) -> None:
+        if trade['status'] == previous_status:
+            return
+        with self.lock:
+            if trade['status'] == 'filled':
+                self._add(trade, 1)
+            elif previous_status == 'filled':
+                self._add(trade, -1)
+
+    def rebuild(self, filled_trades: list) -> None:
+        with self.lock:
+            self.total = 0.0
+            self.by_crypto = {}
+            self.by_day = {}
+            self.filled_count = 0
+            for trade in filled_trades:
+                try:
+                    self._add(trade, 1)
+                except (KeyError, ValueError):
+                    print(f"Skipping malformed trade {trade.get('id')}")
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                'total': self.total,
+                'today': self.by_day.get(datetime.now().strftime('%Y-%m-%d'), 0.0),
+                'by_crypto': dict(self.by_crypto),
+                'by_day': dict(self.by_day),
+                'filled_count': self.filled_count,
+            }
+
+
+PNL = PnLAggregates()
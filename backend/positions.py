@@ -0,0 +1,77 @@
+import threading
+import time
+
+POSITIONS_TTL = 2.5
+
+
+def normalize_position(position: dict) -> dict:
+    quantity = float(position['quantity'])
+    cost_bases = position.get('cost_bases') or []
+    return {
+        'quantity': quantity,
+        'direct_quantity': float(cost_bases[0]['direct_quantity']) if cost_bases else quantity,
+        'cost_basis': float(cost_bases[0]['direct_cost_basis']) if cost_bases else 0.0,
+    }
+
+
+class PositionService:
+    def __init__(self, fetch_positions, ttl: float = POSITIONS_TTL):
+        self.fetch_positions = fetch_positions
+        self.ttl = ttl
+        self.positions = {}
+        self.updated_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.refreshes = 0
+        self.fills_applied = 0
+
+    def refresh(self) -> dict:
+        positions = {position['currency']['code']: normalize_position(position)
+                     for position in self.fetch_positions()}
+        with self.lock:
+            self.positions = positions
+            self.updated_at = time.time()
+            self.refreshes += 1
+        return positions
+
+    def _is_fresh(self, max_age: float) -> bool:
+        return time.time() - self.updated_at <= max_age
+
+    def snapshot(self, max_age: float = None) -> dict:
+        max_age = self.ttl if max_age is None else max_age
+        if not self._is_fresh(max_age):
+            # Every caller that finds the snapshot stale waits on a single refresh
+            with self.refresh_lock:
+                if not self._is_fresh(max_age):
+                    self.refresh()
+        with self.lock:
+            return {crypto: dict(position) for crypto, position in self.positions.items()}
+
+    def holdings(self, max_age: float = None) -> dict:
+        return {crypto: position['quantity'] for crypto, position in self.snapshot(max_age).items()}
+
+    def holding(self, crypto: str, max_age: float = None) -> float:
+        position = self.snapshot(max_age).get(crypto)
+        return position['quantity'] if position is not None else 0.0
+
+    def apply_fill(self, crypto: str, side: str, quantity: float, price: float) -> None:
+        # Reflect a known fill right away; the next cycle's refresh replaces it with the broker's numbers
+        with self.lock:
+            position = self.positions.setdefault(
+                crypto, {'quantity': 0.0, 'direct_quantity': 0.0, 'cost_basis': 0.0})
+            if side == 'buy':
+                position['quantity'] += quantity
+                position['direct_quantity'] += quantity
+                position['cost_basis'] += quantity * price
+            else:
+                if position['direct_quantity'] > 0:
+                    sold_fraction = min(1.0, quantity / position['direct_quantity'])
+                    position['cost_basis'] *= 1 - sold_fraction
+                position['quantity'] = max(0.0, position['quantity'] - quantity)
+                position['direct_quantity'] = max(0.0, position['direct_quantity'] - quantity)
+            self.fills_applied += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'refreshes': self.refreshes, 'fills_applied': self.fills_applied,
+                    'age': time.time() - self.updated_at if self.updated_at else None}
@@ -0,0 +1,218 @@
+from backend.broker import r
+import threading
+import time
+from backend.metrics import broker_call
+from backend.broker_client import broker_request
+
+QUOTES_URL = 'https://api.robinhood.com/marketdata/forex/quotes/'
+POLL_INTERVAL = 2.5
+QUOTE_TTL = 5.0
+# Oldest quote trading decisions may act on when refreshes keep failing
+MAX_TRADING_AGE = 3 * QUOTE_TTL
+
+
+@broker_call('get_pair_id')
+def get_pair_id(crypto: str) -> str:
+    return broker_request('quotes', r.crypto.get_crypto_info, crypto, info='id')
+
+
+@broker_call('fetch_crypto_quotes')
+def fetch_crypto_quotes(pair_ids: dict) -> dict:
+    # One request for every symbol instead of get_crypto_quote's two per symbol
+    results = broker_request('quotes', r.helper.request_get,
+                             QUOTES_URL, 'results', {'ids': ','.join(pair_ids.values())})
+    symbols_by_id = {pair_id: crypto for crypto, pair_id in pair_ids.items()}
+    quotes = {}
+    for quote in results or []:
+        if quote and quote.get('id') in symbols_by_id:
+            quotes[symbols_by_id[quote['id']]] = quote
+    return quotes
+
+
+@broker_call('get_crypto_quote')
+def fetch_crypto_quote(crypto: str) -> dict:
+    return broker_request('quotes', r.crypto.get_crypto_quote, crypto)
+
+
+class QuoteFeed:
+    def __init__(self, symbols: list, poll_interval: float = POLL_INTERVAL, ttl: float = QUOTE_TTL, on_update=None):
+        self.symbols = list(symbols)
+        self.listeners = [on_update] if on_update is not None else []
+        # Session workers turn polling off and are fed the server process's quotes instead
+        self.polling = True
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.quotes = {}
+        self.updated_at = {}
+        self.pair_ids = {}
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.lock = threading.Lock()
+        self.symbol_locks = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        with self.lock:
+            if not self.polling or (self.thread is not None and self.thread.is_alive()):
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self._poll, name='quote-feed', daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def watch(self, crypto: str) -> None:
+        with self.lock:
+            if crypto not in self.symbols:
+                self.symbols.append(crypto)
+
+    def _pair_ids(self, symbols: list) -> dict:
+        # A failed lookup isn't cached, so the symbol joins the batch once a later refresh resolves it
+        for crypto in symbols:
+            if not self.pair_ids.get(crypto):
+                try:
+                    pair_id = get_pair_id(crypto)
+                except Exception as e:
+                    print(f'Pair id lookup for {crypto} failed: {e}')
+                    pair_id = None
+                if pair_id:
+                    self.pair_ids[crypto] = pair_id
+        return {crypto: self.pair_ids[crypto] for crypto in symbols if self.pair_ids.get(crypto)}
+
+    def subscribe(self, callback) -> None:
+        with self.lock:
+            self.listeners.append(callback)
+
+    def ingest(self, quotes: dict) -> None:
+        self._store(quotes)
+
+    def _store(self, quotes: dict) -> None:
+        now = time.time()
+        with self.lock:
+            for crypto, quote in quotes.items():
+                self.quotes[crypto] = quote
+                self.updated_at[crypto] = now
+            listeners = list(self.listeners)
+        if not quotes:
+            return
+        for listener in listeners:
+            try:
+                listener(quotes)
+            except Exception as e:
+                print(f'Quote update callback failed: {e}')
+
+    def refresh(self, symbols: list = None) -> dict:
+        """
+        Fetches fresh quotes and returns the ones that came back; failed symbols keep their previous quote.
+        """
+        symbols = list(self.symbols if symbols is None else symbols)
+        quotes = {}
+        pair_ids = self._pair_ids(symbols)
+        if pair_ids:
+            try:
+                quotes = fetch_crypto_quotes(pair_ids)
+                with self.lock:
+                    self.upstream_calls += 1
+            except Exception as e:
+                with self.lock:
+                    self.upstream_errors += 1
+                print(f'Batched quote request failed ({e}), falling back')
+        for crypto in symbols:
+            if crypto not in quotes:
+                try:
+                    quote = fetch_crypto_quote(crypto)
+                except Exception as e:
+                    print(f'Quote request for {crypto} failed: {e}')
+                    quote = None
+                with self.lock:
+                    self.upstream_calls += 1
+                    self.upstream_errors += 0 if quote else 1
+                if quote:
+                    quotes[crypto] = quote
+        self._store(quotes)
+        return quotes
+
+    def _poll(self) -> None:
+        while not self.stop_event.is_set():
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                with self.lock:
+                    self.upstream_errors += 1
+                print(f'Quote feed refresh failed: {e}')
+            elapsed = time.time() - started
+            self.stop_event.wait(max(0.0, self.poll_interval - elapsed))
+
+    def age(self, crypto: str) -> float:
+        updated_at = self.updated_at.get(crypto)
+        return float('inf') if updated_at is None else time.time() - updated_at
+
+    def _fresh(self, crypto: str, max_age: float) -> dict:
+        if self.age(crypto) <= max_age:
+            return self.quotes[crypto]
+        return None
+
+    def get(self, crypto: str, max_age: float = None) -> dict:
+        max_age = self.ttl if max_age is None else max_age
+        self.watch(crypto)
+        self.start()
+        quote = self._fresh(crypto, max_age)
+        if quote is not None:
+            with self.lock:
+                self.hits += 1
+            return quote
+        with self.lock:
+            self.misses += 1
+            symbol_lock = self.symbol_locks.setdefault(crypto, threading.Lock())
+        # Concurrent misses for the same symbol share a single upstream call
+        with symbol_lock:
+            quote = self._fresh(crypto, max_age)
+            if quote is None:
+                self.refresh([crypto])
+        return self._cached(crypto)
+
+    def get_many(self, cryptos: list, max_age: float = None, max_stale: float = None) -> dict:
+        """
+        Returns quotes no older than max_age, refreshing the rest. A failed refresh falls back to the last good
+        quote, unless it is older than max_stale; those symbols are left out so callers skip them.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        for crypto in cryptos:
+            self.watch(crypto)
+        self.start()
+        stale = [crypto for crypto in cryptos if self.age(crypto) > max_age]
+        with self.lock:
+            self.hits += len(cryptos) - len(stale)
+            self.misses += len(stale)
+        if stale:
+            self.refresh(stale)
+        if max_stale is not None:
+            cryptos = [crypto for crypto in cryptos if self.age(crypto) <= max_stale]
+        return {crypto: self._cached(crypto) for crypto in cryptos}
+
+    def _cached(self, crypto: str) -> dict:
+        # Falls back to the last good quote when a refresh failed; only a symbol never quoted is an error
+        with self.lock:
+            quote = self.quotes.get(crypto)
+        if quote is None:
+            raise ValueError(f'No quote available for {crypto}')
+        return quote
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'upstream_calls': self.upstream_calls,
+                'upstream_errors': self.upstream_errors,
+                'symbols': {crypto: {'age': round(time.time() - updated_at, 3)}
+                            for crypto, updated_at in self.updated_at.items()},
+            }
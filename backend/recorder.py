@@ -0,0 +1,119 @@
+import queue
+import threading
+from concurrent.futures import Future
+from backend.trade_store import TRADE_STORE, public_trade
+from backend.pnl import PNL
+from backend.events import EVENTS
+
+QUEUE_SIZE = 1000
+BATCH_SIZE = 100
+
+
+class TradeRecorder:
+    def __init__(self, store, pnl, maxsize: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE, on_write=None):
+        self.store = store
+        self.pnl = pnl
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.written = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name='trade-recorder', daemon=True)
+                self.thread.start()
+
+    def record(self, trade: dict) -> Future:
+        # Blocks the caller when the queue is full so a stalled writer applies backpressure
+        future = Future()
+        self.start()
+        self.queue.put((trade, future))
+        return future
+
+    def flush(self) -> None:
+        self.queue.join()
+
+    def _next_batch(self) -> list:
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list) -> None:
+        try:
+            results = self.store.upsert_many([trade for trade, _ in batch])
+        except Exception as e:
+            print(f'Failed to record {len(batch)} trades: {e}')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        written = []
+        for result, (_, future) in zip(results, batch):
+            if isinstance(result, Exception):
+                print(f'Failed to record trade: {result}')
+                future.set_exception(result)
+                continue
+            record, previous_status = result
+            # The trade is stored either way; a P&L hiccup must not hide it from its caller or the stream
+            try:
+                self.pnl.record_transition(record, previous_status)
+            except Exception as e:
+                print(f"Failed to apply trade {record['id']} to P&L: {e}")
+            future.set_result(record)
+            written.append(result)
+        self.written += len(written)
+        self.batches += 1
+        if self.on_write is not None and written:
+            try:
+                self.on_write(written)
+            except Exception as e:
+                print(f'Trade write callback failed: {e}')
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {'queued': self.queue.qsize(), 'written': self.written, 'batches': self.batches}
+
+
+def publish_trades(results: list) -> None:
+    # One pnl event per batch, after every transition in it has been applied
+    changed = [(record, previous_status) for record, previous_status in results
+               if record['status'] != previous_status]
+    for record, _ in changed:
+        EVENTS.publish('trade', public_trade(record))
+    if any('filled' in (record['status'], previous_status) for record, previous_status in changed):
+        EVENTS.publish('pnl', PNL.summary())
+
+
+RECORDER = TradeRecorder(TRADE_STORE, PNL, on_write=publish_trades)
+
+
+TRADE_SINK = None
+
+
+def set_trade_sink(sink) -> None:
+    # Session worker processes forward trades to the server process instead of writing the store themselves
+    global TRADE_SINK
+    TRADE_SINK = sink
+
+
+def record_trade(trade: dict) -> Future:
+    if TRADE_SINK is not None:
+        return TRADE_SINK(trade)
+    return RECORDER.record(trade)
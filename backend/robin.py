@@ -1,22 +1,19 @@
-import robin_stocks.robinhood as r
-import time
+from backend.broker import r, is_simulated
 import json
-import threading
-import csv
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from termcolor import colored
-
-MINS = {
-    'DOGE': 1.0,
-    'XLM': 1.0,
-    'BTC': 0.000001,
-    'SHIB': 500,
-    'XTZ': 0.01,
-    'ETH': 0.0001
-}
-
-STOP_SIGNAL = threading.Event()
+from backend.quotes import QuoteFeed
+from backend.orders import OrderTracker, FILL_TIMEOUT
+from backend.candles import CANDLES
+from backend.positions import PositionService
+from backend.strategy import MINS
+from backend.recorder import record_trade
+from backend.trade_store import TRADE_STORE
+from backend.metrics import broker_call
+from backend.broker_client import broker_request
+from backend.events import EVENTS
+from backend.journal import JOURNAL
+from backend.sessions import SESSIONS, DEFAULT_ACCOUNT
 
 
 def hours_to_seconds(hours: int) -> int:
@@ -34,7 +31,26 @@ def get_current_time() -> str:
 
 
 CRYPTOS = ['DOGE', 'BTC', 'SHIB', 'XTZ', 'XLM', 'ETH']
-RUN_TIME = hours_to_seconds(8)
+
+
+PUBLISHED_PRICES = {}
+
+
+def quote_prices(quote: dict) -> dict:
+    # bid_price is what /positions values holdings at; mark_price is the mid the engine trades on
+    return {'bid_price': quote['bid_price'], 'mark_price': quote['mark_price']}
+
+
+def publish_quotes(quotes: dict) -> None:
+    # Streams get a full snapshot on connect, so ticks only carry prices that moved
+    changed = {crypto: quote_prices(quote) for crypto, quote in quotes.items()
+               if PUBLISHED_PRICES.get(crypto) != quote_prices(quote)}
+    if changed:
+        PUBLISHED_PRICES.update(changed)
+        EVENTS.publish('quotes', changed, replay=False)
+
+
+QUOTES = QuoteFeed(CRYPTOS, on_update=publish_quotes)
 
 
 def get_login_info() -> dict:
@@ -43,40 +59,91 @@ def get_login_info() -> dict:
     return data
 
 
+def login_account(credentials: dict, account: str = '') -> None:
+    if is_simulated():
+        broker_request('login', r.login)
+        return
+    # Each account keeps its own stored session instead of overwriting the shared default pickle
+    broker_request('login', r.login, credentials['email'], credentials['password'], pickle_name=account)
+
+
 def login_to_robinhood() -> None:
-    INFO = get_login_info()
-    r.login(INFO['email'], INFO['password'])
+    login_account(None if is_simulated() else get_login_info())
 
 
 def get_crypto_price(crypto: str) -> float:
-    data = r.crypto.get_crypto_quote(crypto)
+    data = QUOTES.get(crypto)
     return float(data['mark_price'])
 
 
 def get_crypto_data(crypto) -> dict:
-    return r.crypto.get_crypto_quote(crypto)
+    return QUOTES.get(crypto)
+
+
+def get_crypto_quotes(cryptos: list, max_stale: float = None) -> dict:
+    return QUOTES.get_many(cryptos, max_stale=max_stale)
+
+
+def get_quote_stats() -> dict:
+    return QUOTES.stats()
+
+
+@broker_call('get_crypto_positions')
+def fetch_crypto_positions() -> list:
+    return broker_request('positions', r.crypto.get_crypto_positions)
+
+
+POSITIONS = PositionService(fetch_crypto_positions)
 
 
 def get_crypto_position() -> dict:
-    return r.crypto.get_crypto_positions()
+    return POSITIONS.snapshot()
+
 
+def get_crypto_candles(crypto: str, interval: str, span: str) -> dict:
+    return CANDLES.window(crypto, interval, span)
 
-def get_crypto_historical(crypto: str, interval: str, span: str) -> dict:
-    return r.crypto.get_crypto_historicals(symbol=crypto, interval=interval, span=span)
 
+def get_candle_stats() -> dict:
+    return CANDLES.stats()
 
+
+def warm_up_candles() -> None:
+    CANDLES.warm_up(CRYPTOS)
+
+
+@broker_call('get_account_info')
 def get_account_info() -> dict:
-    account_profile = r.profiles.load_account_profile()
+    account_profile = broker_request('account', r.profiles.load_account_profile)
     return account_profile
 
 
+@broker_call('execute_sell_order')
 def execute_sell_order(sell_amount: str, crypto: str) -> dict:
     # print(colored(f"Attempting to sell {sell_amount} {crypto}", 'blue'))
-    return r.orders.order_sell_crypto_by_quantity(crypto, sell_amount)
+    return broker_request('orders', r.orders.order_sell_crypto_by_quantity, crypto, sell_amount)
 
 
+@broker_call('get_order_info')
 def get_order_info(order_id: str) -> dict:
-    return r.orders.get_crypto_order_info(order_id)
+    return broker_request('order_status', r.orders.get_crypto_order_info, order_id)
+
+
+ORDERS = OrderTracker(get_order_info, journal=JOURNAL)
+
+
+def get_tracked_order(order_id: str) -> dict:
+    handle = ORDERS.get(order_id)
+    if handle is not None:
+        return handle.to_dict()
+    # Session workers track their own orders; the server only knows them through the journal
+    record = JOURNAL.get(order_id)
+    if record is None:
+        return None
+    return {'id': record['id'], 'status': record['status'], 'state': record['state'],
+            'placed_at': record['placed_at'],
+            'finished_at': record['updated_at'] if record['status'] != 'pending' else None,
+            'checks': None, 'account': record.get('account')}
 
 
 def format_value(value: float) -> float:
@@ -92,43 +159,15 @@ def round_value(value: float, price=False) -> float:
         return float(round(value, 2))
 
 
-def get_crypto_holding(crypto: str) -> int:
-    crypto_positions = r.crypto.get_crypto_positions()
-    for position in crypto_positions:
-        if position['currency']['code'] == crypto:
-            quantity = float(position['quantity'])
-            break
-    return quantity if quantity is not None else "N/A"
-
-
-def is_greater_than(value: float, threshold: float, tol=1e-9) -> bool:
-    adjusted_threshold = threshold - tol
-    return value > adjusted_threshold
-
-
-def check_if_sell(crypto: str, amount_quantity: float) -> bool:
-    return is_greater_than(amount_quantity, MINS[crypto])
-
-
-def log_sell(crypto: str, data: dict) -> None:
-    amount = float(data['price']) * float(data['quantity'])
-    time = get_current_time()
-    # print(colored(f"\n\n**SELL**", 'green'))
-    # print(
-    # colored(f'**{crypto} sold for ${round(amount, 2)} ({time})**', 'green'))
-    # print(colored("**SELL**\n\n", 'green'))
-    with open('./orders/log.csv', 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([crypto, amount])
-    with open('./orders/time.txt', 'a', newline='') as file:
-        file.write(time + '\n')
+def get_crypto_holdings(max_age: float = None) -> dict:
+    return POSITIONS.holdings(max_age)
 
 
 def make_request(crypto: str, quantity: float, price: float, status: str, data: dict, type="sell") -> None:
     dollar_value = '$' + str(round_value((quantity * price)))
     quantity = str(round_value(quantity))
     price = '$' + str(round_value(price, True))
-    requests.post('http://127.0.0.1:5000/record-trade', json={
+    record_trade({
         'id': data['id'],
         'type': type,
         'crypto': crypto,
@@ -141,11 +180,86 @@ def make_request(crypto: str, quantity: float, price: float, status: str, data:
     })
 
 
+def order_callback(crypto: str, quantity: float, price: float, type="sell"):
+    def on_update(status: str, data: dict) -> None:
+        if status == 'filled':
+            filled_quantity = float(data.get('cumulative_quantity') or quantity)
+            POSITIONS.apply_fill(crypto, type, filled_quantity, price)
+        make_request(crypto, quantity, price, status, data, type=type)
+    return on_update
+
+
+def track_order(initial_data: dict, crypto: str, quantity: float, price: float, type="sell"):
+    details = {'crypto': crypto, 'type': type, 'quantity': quantity, 'price': price}
+    return ORDERS.track(initial_data, order_callback(crypto, quantity, price, type=type), details)
+
+
+def legacy_pending_orders(known: set) -> list:
+    # Pending trades from before the journal existed only live in the trade store
+    records = []
+    for trade in TRADE_STORE.trades_by_status('pending'):
+        if trade['id'] in known:
+            continue
+        try:
+            records.append({'id': trade['id'], 'crypto': trade['crypto'], 'type': trade['type'] or 'sell',
+                            'quantity': float(trade['amount']), 'price': float(trade['price'].lstrip('$')),
+                            'placed_at': trade['created_at']})
+        except (TypeError, ValueError):
+            print(f"Skipping unreadable pending trade {trade['id']}")
+    return records
+
+
+def recover_account_orders(account: str, records: list) -> dict:
+    def callback_for(record: dict):
+        return order_callback(record['crypto'], record['quantity'], record['price'], type=record['type'])
+
+    # The simulator is shared by every session, so only real accounts need their own login
+    if account == DEFAULT_ACCOUNT or is_simulated():
+        return ORDERS.reconcile(records, callback_for)
+    try:
+        found = SESSIONS.lookup_orders(account, [record['id'] for record in records], FILL_TIMEOUT)
+    except Exception as e:
+        print(f'Looking up pending orders for {account} failed: {e}')
+        found = {}
+    return ORDERS.reconcile(records, callback_for, lookup=found.get)
+
+
+def recover_orders() -> dict:
+    """
+    Settles the orders a previous run left pending, looking them all up in parallel with the login of the
+    account that placed them.
+    """
+    pending = JOURNAL.open()
+    legacy = legacy_pending_orders({record['id'] for record in pending})
+    for record in legacy:
+        JOURNAL.placed(record['id'], {field: record[field] for field in ('crypto', 'type', 'quantity', 'price')}, {})
+    by_account = {}
+    for record in pending + legacy:
+        by_account.setdefault(record.get('account') or DEFAULT_ACCOUNT, []).append(record)
+    counts = {'filled': 0, 'failed': 0, 'resumed': 0, 'unresolved': 0}
+    if by_account:
+        with ThreadPoolExecutor(max_workers=len(by_account), thread_name_prefix='account-recovery') as pool:
+            for account_counts in pool.map(lambda item: recover_account_orders(*item), by_account.items()):
+                for key, value in account_counts.items():
+                    counts[key] += value
+    print(f'Recovered {len(pending) + len(legacy)} pending orders: {counts}')
+    return counts
+
+
+def get_order_summary() -> dict:
+    return JOURNAL.summary()
+
+
+@broker_call('place_buy_order')
+def place_buy_order(crypto: str, buy_amount: float) -> dict:
+    return broker_request('orders', r.orders.order_buy_crypto_by_quantity, crypto, buy_amount)
+
+
 def execute_buy_order(crypto: str, buy_amount: str) -> None:
     buy_amount = float(buy_amount)
     if buy_amount < MINS[crypto]:
         return {'Message': f'Must buy more than {MINS[crypto]} {crypto} at a time', 'status': 'Not Enough Crypto'}
-    account_profile = r.profiles.load_account_profile()
+    account_profile = get_account_info()
     available_cash = account_profile['cash']
     if available_cash[0] == '$':
         available_cash = available_cash[1:]
@@ -153,109 +267,10 @@ def execute_buy_order(crypto: str, buy_amount: str) -> None:
     cost = price * float(buy_amount)
     if float(available_cash) - 0.01 >= cost:
         # print(f"Buying {crypto} for ${buy_amount}")
-        initial_data = r.orders.order_buy_crypto_by_quantity(
-            crypto, buy_amount)
-        id = initial_data['id']
-        make_request(crypto, buy_amount, price,
-                     'pending', initial_data, type="buy")
-        time.sleep(30)
-        post_data = get_order_info(id)
-        if post_data['state'] == 'filled':
-            make_request(crypto, buy_amount,
-                         price, 'filled', post_data, type="buy")
-        else:
-            make_request(crypto, buy_amount,
-                         price, 'failed', post_data, type="buy")
-        return {'Message': f'Order for {buy_amount} {crypto} {" was filled" if post_data["state"] == "filled" else " failed"}', 'status': post_data['state']}
+        initial_data = place_buy_order(crypto, buy_amount)
+        handle = track_order(initial_data, crypto, buy_amount, price, type="buy")
+        return {'Message': f'Order for {buy_amount} {crypto} was placed', 'status': handle.status, 'id': handle.id}
     else:
         # print(f"Insufficient funds to buy \
         # {buy_amount} {crypto}. Available cash: ${available_cash}")
         return {'Message': f'Insufficient funds to buy {buy_amount} {crypto}', 'status': 'Insufficient Funds'}
-
-
-def run_crypto(crypto: str, start_time: int, run_time: int) -> None:
-    initial_holdings = get_crypto_holding(crypto)
-    current_price = get_crypto_price(crypto)
-    initial_value = initial_holdings * current_price
-    # print(f"Initial {crypto} Holdings: {initial_holdings}")
-    account_profile = r.profiles.load_account_profile()
-    available_cash = account_profile['cash']
-    if available_cash[0] == '$':
-        available_cash = available_cash[1:]
-    # print(f"Available Cash: ${available_cash}")
-    current_price = get_crypto_price(crypto)
-    while True:
-        if STOP_SIGNAL.is_set() or time.time() - start_time >= run_time:
-            print('Stopped Auto Trading Process')
-            break
-        current_price = get_crypto_price(crypto)
-        # print(f"Current {crypto} price: ${current_price}")
-        current_holdings = get_crypto_holding(crypto)
-        current_value = current_price * current_holdings
-        to_sell = current_value - initial_value
-        if is_greater_than(to_sell, 1.0):
-            to_sell = to_sell * 0.75
-        to_sell_quantity = to_sell / current_price
-        if is_greater_than(current_value, initial_value) and check_if_sell(crypto, to_sell_quantity):
-            intial_data = execute_sell_order(
-                round_value(to_sell_quantity), crypto)
-            id = intial_data['id']
-            make_request(crypto, to_sell_quantity,
-                         current_price, 'pending', intial_data)
-            time.sleep(30)
-            post_data = get_order_info(id)
-            if post_data['state'] == 'filled':
-                make_request(crypto, to_sell_quantity,
-                             current_price, 'filled', post_data)
-            else:
-                # print(colored("\n\n**FAILED**", 'red'))
-                # print(
-                # colored(f"Order for ${round(to_sell, 2)} of {crypto} was not filled ({get_current_time()})", 'red'))
-                # print(colored("**FAILED**\n\n", 'red'))
-                make_request(crypto, to_sell_quantity,
-                             current_price, 'failed', post_data)
-        time.sleep(2.5)
-
-
-def get_last_order_time() -> str:
-    last_time = ''
-    with open('./orders/time.txt', 'r') as file:
-        for line in file:
-            last_time = line.strip()
-    return last_time
-
-
-def running_sum(start_time: int) -> None:
-    while True:
-        if time.time() - start_time > RUN_TIME:
-            break
-        total_amount = 0
-        with open('./orders/log.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    total_amount += float(row[' amount'])
-                except:
-                    pass
-        # print(colored(f'Total amount: ${round(total_amount, 2)}', 'yellow'))
-        # print(colored(f"Last Sale: {get_last_order_time()}", 'yellow'))
-        time.sleep(20)
-
-
-def run(run_time, interval, cryptos) -> None:
-    if interval == 'minutes':
-        run_time = minutes_to_seconds(run_time)
-    elif interval == 'hours':
-        run_time = hours_to_seconds(run_time)
-    threads = []
-    start_time = time.time()
-    print(run_time)
-    for crypto in cryptos:
-        time.sleep(3)
-        thread = threading.Thread(
-            target=run_crypto, args=(crypto, start_time, run_time))
-        threads.append(thread)
-        thread.start()
-
-    for thread in threads:
-        thread.join()
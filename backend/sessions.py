@@ -0,0 +1,393 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from backend.events import EVENTS
+from backend.recorder import record_trade
+from backend.journal import JOURNAL
+
+ACCOUNTS_FILE = './utility_files/accounts.json'
+ACCOUNT_FILE = './utility_files/account.json'
+DEFAULT_ACCOUNT = 'default'
+MAX_SESSIONS = int(os.environ.get('MAX_TRADING_SESSIONS', max(2, os.cpu_count() or 1)))
+METRICS_INTERVAL = 5.0
+STOP_TIMEOUT = 45.0
+ACTIVE_STATES = ('starting', 'running', 'stopping')
+# Simulated broker calls a worker forwards to the server process
+BROKER_CALL_TIMEOUT = 30.0
+BROKER_WORKERS = 8
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+def load_accounts() -> dict:
+    """
+    Reads {name: {email, password}} from accounts.json, falling back to the single account.json as "default".
+    """
+    if os.path.exists(ACCOUNTS_FILE):
+        with open(ACCOUNTS_FILE, 'r') as file:
+            return json.load(file)
+    if os.path.exists(ACCOUNT_FILE):
+        with open(ACCOUNT_FILE, 'r') as file:
+            return {DEFAULT_ACCOUNT: json.load(file)}
+    return {}
+
+
+def run_session_worker(session_id: str, account: str, credentials: dict, cryptos: list, run_time: float,
+                       stop_event, outbox, inbox) -> None:
+    # Runs in a spawned process: its own broker login, order tracker and engine. Quotes and its share of
+    # the account's rate budget come from the server process over the inbox, and so do simulated broker calls
+    def forward_trade(trade: dict) -> Future:
+        outbox.put(('trade', session_id, trade))
+        future = Future()
+        future.set_result(trade)
+        return future
+
+    def forward_journal(event: dict) -> Future:
+        outbox.put(('journal', session_id, event))
+        future = Future()
+        future.set_result(None)
+        return future
+
+    from backend import recorder
+    recorder.set_trade_sink(forward_trade)
+    from backend.journal import JOURNAL as worker_journal
+    worker_journal.set_sink(forward_journal)
+    from backend.robin import ORDERS, QUOTES, login_account
+    from backend.broker_client import CLIENT
+    from backend.broker import r, is_simulated
+    QUOTES.polling = False
+    broker_calls = {}
+
+    def call_broker(name: str, args: tuple, kwargs: dict):
+        request_id = uuid.uuid4().hex
+        future = broker_calls[request_id] = Future()
+        outbox.put(('broker', session_id, (request_id, name, args, kwargs)))
+        try:
+            return future.result(BROKER_CALL_TIMEOUT)
+        finally:
+            broker_calls.pop(request_id, None)
+
+    # A simulator of its own would fill orders against cash and holdings the server never sees
+    if is_simulated():
+        r.forward_to(call_broker)
+
+    def receive() -> None:
+        while True:
+            kind, payload = inbox.get()
+            if kind == 'quotes':
+                QUOTES.ingest(payload)
+            elif kind == 'budget':
+                CLIENT.set_share(payload)
+            elif kind == 'broker':
+                request_id, result, error = payload
+                future = broker_calls.get(request_id)
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    threading.Thread(target=receive, name='session-inbox', daemon=True).start()
+    from backend.orders import FILL_TIMEOUT
+    from backend.engine import TradingEngine
+    login_account(credentials, account)
+    engine = TradingEngine(cryptos, run_time, stop_signal=stop_event)
+    done = threading.Event()
+
+    def session_metrics() -> dict:
+        return dict(engine.metrics(), broker=CLIENT.flat_stats())
+
+    def report_metrics() -> None:
+        while not done.wait(METRICS_INTERVAL):
+            outbox.put(('metrics', session_id, session_metrics()))
+
+    threading.Thread(target=report_metrics, daemon=True).start()
+    outbox.put(('status', session_id, 'running', None))
+    try:
+        engine.run()
+        # Let outstanding orders reach a final status so their trades are forwarded before exiting
+        for handle in ORDERS.outstanding():
+            handle.wait(FILL_TIMEOUT)
+    except Exception as e:
+        outbox.put(('status', session_id, 'failed', repr(e)))
+        raise
+    finally:
+        done.set()
+        outbox.put(('metrics', session_id, session_metrics()))
+    outbox.put(('status', session_id, 'stopped' if stop_event.is_set() else 'finished', None))
+
+
+def lookup_account_orders(account: str, credentials: dict, order_ids: list, timeout: float) -> dict:
+    """
+    Runs in a short-lived spawned process logged in as account: looks up each order, polls the ones still open
+    until they settle or timeout passes, and returns {order_id: data} for every order the broker knows.
+    """
+    from backend.robin import get_order_info, login_account
+    from backend.orders import OrderTracker
+    login_account(credentials, account)
+    tracker = OrderTracker(get_order_info, timeout=timeout)
+    tracker.reconcile([{'id': order_id} for order_id in order_ids], lambda record: None)
+    for handle in tracker.outstanding():
+        handle.wait(timeout)
+    handles = {order_id: tracker.get(order_id) for order_id in order_ids}
+    return {order_id: handle.data for order_id, handle in handles.items() if handle is not None}
+
+
+class TradingSession:
+    def __init__(self, account: str, cryptos: list, run_time: float, stop_event):
+        self.id = uuid.uuid4().hex[:12]
+        self.account = account
+        self.cryptos = list(cryptos)
+        self.run_time = run_time
+        self.stop_event = stop_event
+        self.process = None
+        self.inbox = None
+        self.status = 'starting'
+        self.error = None
+        self.metrics = {}
+        self.order_ids = set()
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'account': self.account,
+            'cryptos': self.cryptos,
+            'run_time': self.run_time,
+            'status': self.status,
+            'error': self.error,
+            'pid': self.process.pid if self.process is not None else None,
+            'trades': len(self.order_ids),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'metrics': self.metrics,
+        }
+
+
+class SessionManager:
+    """
+    Runs each auto-trading session in its own spawned worker process, so sessions scale across cores and
+    accounts and a crash only takes down its own session. Workers send trades, journal events, metrics and status
+    back over one queue; a monitor thread records them through the in-process recorder and journal.
+    """
+
+    def __init__(self, record=record_trade, publish=EVENTS.publish, accounts=load_accounts,
+                 max_sessions: int = MAX_SESSIONS, journal=JOURNAL.append):
+        self.record = record
+        self.journal = journal
+        self.publish = publish
+        self.accounts = accounts
+        self.max_sessions = max_sessions
+        self.context = multiprocessing.get_context('spawn')
+        self.outbox = None
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.monitor = None
+        self.sharing_quotes = False
+        self.broker_pool = None
+
+    def _credentials(self, account: str) -> dict:
+        from backend.broker import is_simulated
+        accounts = self.accounts()
+        if account in accounts:
+            return accounts[account]
+        if is_simulated():
+            return None
+        raise ValueError(f'Unknown account {account}')
+
+    def lookup_orders(self, account: str, order_ids: list, timeout: float) -> dict:
+        """
+        Looks up orders placed by another account's sessions with that account's login, which the server's
+        own login can't see.
+        """
+        credentials = self._credentials(account)
+        with ProcessPoolExecutor(max_workers=1, mp_context=self.context) as pool:
+            return pool.submit(lookup_account_orders, account, credentials, order_ids, timeout).result()
+
+    def start(self, account: str, cryptos: list, run_time: float) -> tuple:
+        """
+        Starts a session, or returns the active one already trading any of these cryptos on this account.
+
+        Returns (session, created).
+        """
+        credentials = self._credentials(account)
+        with self.lock:
+            for session in self.sessions.values():
+                if session.active() and session.account == account and set(session.cryptos) & set(cryptos):
+                    return session, False
+            if sum(session.active() for session in self.sessions.values()) >= self.max_sessions:
+                raise SessionLimitError(f'{self.max_sessions} trading sessions are already running')
+            if self.outbox is None:
+                self.outbox = self.context.Queue()
+            session = TradingSession(account, cryptos, run_time, self.context.Event())
+            session.inbox = self.context.Queue()
+            session.process = self.context.Process(
+                target=run_session_worker, name=f'trading-session-{session.id}', daemon=True,
+                args=(session.id, account, credentials, session.cryptos, run_time, session.stop_event, self.outbox,
+                      session.inbox))
+            self.sessions[session.id] = session
+            session.process.start()
+            self._ensure_monitor()
+        self._rebalance()
+        self._share_quotes(session)
+        self._publish(session)
+        return session, True
+
+    def _send(self, session: TradingSession, message: tuple) -> None:
+        try:
+            session.inbox.put_nowait(message)
+        except Exception as e:
+            print(f'Message to session {session.id} failed: {e}')
+
+    def _rebalance(self) -> None:
+        """
+        Splits each account's broker rate budget evenly between its sessions, counting the server process as
+        one more user of the default account, so adding sessions never multiplies the calls an account makes.
+        """
+        from backend.broker_client import CLIENT
+        active = [session for session in self.list() if session.active()]
+        counts = {}
+        for session in active:
+            counts[session.account] = counts.get(session.account, 0) + 1
+        for session in active:
+            users = counts[session.account] + (1 if session.account == DEFAULT_ACCOUNT else 0)
+            self._send(session, ('budget', 1.0 / users))
+        CLIENT.set_share(1.0 / (counts.get(DEFAULT_ACCOUNT, 0) + 1))
+
+    def _share_quotes(self, session: TradingSession) -> None:
+        # One quote poll in the server process feeds every worker instead of each worker polling on its own
+        from backend.robin import QUOTES
+        for crypto in session.cryptos:
+            QUOTES.watch(crypto)
+        with self.lock:
+            subscribe = not self.sharing_quotes
+            self.sharing_quotes = True
+        if subscribe:
+            QUOTES.subscribe(self._broadcast_quotes)
+        QUOTES.start()
+
+    def _broadcast_quotes(self, quotes: dict) -> None:
+        for session in self.list():
+            if session.active():
+                relevant = {crypto: quote for crypto, quote in quotes.items() if crypto in session.cryptos}
+                if relevant:
+                    self._send(session, ('quotes', relevant))
+
+    def _serve_broker(self, session: TradingSession, call: tuple) -> None:
+        from backend.broker import r
+        request_id, name, args, kwargs = call
+        try:
+            result, error = r.serve(name, args, kwargs), None
+        except Exception as e:
+            result, error = None, e
+        self._send(session, ('broker', (request_id, result, error)))
+
+    def stop(self, session_id: str) -> TradingSession:
+        session = self.get(session_id)
+        if session is None or not session.active():
+            return session
+        session.stop_event.set()
+        self._set_status(session, 'stopping')
+        threading.Thread(target=self._reap_after_stop, args=(session,), daemon=True).start()
+        return session
+
+    def stop_account(self, account: str) -> list:
+        return [self.stop(session.id) for session in self.list() if session.account == account and session.active()]
+
+    def _reap_after_stop(self, session: TradingSession) -> None:
+        session.process.join(STOP_TIMEOUT)
+        if session.process.is_alive():
+            print(f'Session {session.id} did not stop in {STOP_TIMEOUT}s, terminating')
+            session.process.terminate()
+
+    def get(self, session_id: str) -> TradingSession:
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def list(self) -> list:
+        with self.lock:
+            return list(self.sessions.values())
+
+    def running(self) -> bool:
+        return any(session.active() for session in self.list())
+
+    def _publish(self, session: TradingSession) -> None:
+        self.publish('auto-trade', {'session': session.id, 'account': session.account, 'cryptos': session.cryptos,
+                                    'status': session.status, 'running': session.active()})
+
+    def _set_status(self, session: TradingSession, status: str, error: str = None) -> None:
+        # Final states stick; a late message from a worker must not revive a finished session
+        if not session.active() or session.status == status:
+            return
+        if session.status == 'stopping' and status == 'running':
+            return
+        session.status = status
+        session.error = error or session.error
+        if not session.active():
+            session.finished_at = time.time()
+            self._rebalance()
+        self._publish(session)
+
+    def _ensure_monitor(self) -> None:
+        if self.monitor is None or not self.monitor.is_alive():
+            self.monitor = threading.Thread(target=self._monitor, name='session-monitor', daemon=True)
+            self.monitor.start()
+
+    def _handle(self, message: tuple) -> None:
+        kind, session_id, payload = message[0], message[1], message[2]
+        session = self.get(session_id)
+        if session is None:
+            return
+        if kind == 'trade':
+            session.order_ids.add(payload.get('id'))
+            self.record(payload)
+        elif kind == 'broker':
+            # Simulated broker calls can sleep for their latency, so they don't hold up the monitor
+            with self.lock:
+                if self.broker_pool is None:
+                    self.broker_pool = ThreadPoolExecutor(max_workers=BROKER_WORKERS,
+                                                          thread_name_prefix='session-broker')
+            self.broker_pool.submit(self._serve_broker, session, payload)
+        elif kind == 'journal':
+            self.journal(dict(payload, account=session.account))
+        elif kind == 'metrics':
+            session.metrics = payload
+        elif kind == 'status':
+            self._set_status(session, payload, message[3])
+
+    def _reap(self) -> None:
+        for session in self.list():
+            if session.active() and session.process is not None and session.process.exitcode is not None:
+                exitcode = session.process.exitcode
+                if exitcode == 0:
+                    self._set_status(session, 'stopped' if session.stop_event.is_set() else 'finished')
+                else:
+                    self._set_status(session, 'failed', f'worker exited with code {exitcode}')
+
+    def _monitor(self) -> None:
+        last_reap = time.monotonic()
+        while True:
+            try:
+                self._handle(self.outbox.get(timeout=1.0))
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f'Session message failed: {e}')
+            if time.monotonic() - last_reap >= 1.0:
+                self._reap()
+                last_reap = time.monotonic()
+
+
+SESSIONS = SessionManager()
@@ -0,0 +1,281 @@
+import math
+import operator
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import numpy as np
+from requests.exceptions import HTTPError
+
+BASE_PRICES = {'DOGE': 0.15, 'BTC': 60000.0, 'SHIB': 0.000025,
+               'XTZ': 1.0, 'XLM': 0.11, 'ETH': 3000.0}
+INTERVAL_SECONDS = {'15second': 15, '5minute': 300, '10minute': 600,
+                    'hour': 3600, 'day': 86400, 'week': 604800}
+SPAN_SECONDS = {'hour': 3600, 'day': 86400, 'week': 604800, 'month': 30 * 86400,
+                '3month': 90 * 86400, 'year': 365 * 86400, '5year': 5 * 365 * 86400}
+PRICE_STEP = 15
+SPREAD = 0.001
+
+
+def format_price(price: float) -> str:
+    return f'{price:.10g}'
+
+
+class SimulatedBroker:
+    """
+    Offline stand-in for robin_stocks.robinhood exposing the crypto, orders, profiles and helper calls the app uses.
+
+    Prices follow a seeded random walk (or a sine wave, or a replay of stored 15-second candles), every call
+    sleeps for the configured latency, and orders fill after fill_delay seconds with probability fill_probability.
+    Setting max_rps makes calls beyond that rate fail with a 429 like a throttled broker would.
+    """
+
+    def __init__(self, latency: float = 0.05, latency_jitter: float = 0.02, fill_probability: float = 0.95,
+                 fill_delay: float = 2.0, price_path: str = 'random_walk', volatility: float = 0.0005,
+                 cash: float = 10000.0, holdings: dict = None, max_rps: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.fill_probability = fill_probability
+        self.fill_delay = fill_delay
+        self.price_path = price_path
+        self.volatility = volatility
+        self.cash = cash
+        self.holdings = dict(holdings) if holdings is not None else {
+            crypto: 1000.0 / price for crypto, price in BASE_PRICES.items()}
+        self.cost_basis = {crypto: quantity * BASE_PRICES.get(crypto, 1.0)
+                           for crypto, quantity in self.holdings.items()}
+        self.max_rps = max_rps
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.order_book = {}
+        self.calls = {}
+        self.throttled = 0
+        self.window_start = time.time()
+        self.window_calls = 0
+        self.replay_prices = {}
+        self.walks = {}
+        self.walk_lock = threading.Lock()
+        self.crypto = SimpleNamespace(
+            get_crypto_info=self.get_crypto_info, get_crypto_quote=self.get_crypto_quote,
+            get_crypto_historicals=self.get_crypto_historicals, get_crypto_positions=self.get_crypto_positions)
+        self.orders = SimpleNamespace(
+            order_buy_crypto_by_quantity=self.order_buy_crypto_by_quantity,
+            order_sell_crypto_by_quantity=self.order_sell_crypto_by_quantity,
+            get_crypto_order_info=self.get_crypto_order_info)
+        self.profiles = SimpleNamespace(load_account_profile=self.load_account_profile)
+        self.helper = SimpleNamespace(request_get=self.request_get)
+
+    @classmethod
+    def from_env(cls) -> 'SimulatedBroker':
+        return cls(latency=float(os.environ.get('SIM_LATENCY', 0.05)),
+                   latency_jitter=float(os.environ.get('SIM_LATENCY_JITTER', 0.02)),
+                   fill_probability=float(os.environ.get('SIM_FILL_PROBABILITY', 0.95)),
+                   fill_delay=float(os.environ.get('SIM_FILL_DELAY', 2.0)),
+                   price_path=os.environ.get('SIM_PRICE_PATH', 'random_walk'),
+                   volatility=float(os.environ.get('SIM_VOLATILITY', 0.0005)),
+                   cash=float(os.environ.get('SIM_CASH', 10000.0)),
+                   max_rps=float(os.environ.get('SIM_MAX_RPS', 0.0)),
+                   seed=int(os.environ.get('SIM_SEED', 0)))
+
+    def forward_to(self, call) -> None:
+        """
+        Sends every broker call to another process's simulator through call(name, args, kwargs), so session
+        workers trade against the server's cash, holdings and order book instead of a copy of their own.
+        """
+        def remote(name: str):
+            return lambda *args, **kwargs: call(name, args, kwargs)
+
+        self.login = remote('login')
+        for group in ('crypto', 'orders', 'profiles', 'helper'):
+            setattr(self, group, SimpleNamespace(
+                **{method: remote(f'{group}.{method}') for method in vars(getattr(self, group))}))
+
+    def serve(self, name: str, args: tuple, kwargs: dict):
+        # The other end of forward_to, run in the process that owns the simulator
+        return operator.attrgetter(name)(self)(*args, **kwargs)
+
+    def _call(self, name: str) -> None:
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            now = time.time()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_calls = 0
+            self.window_calls += 1
+            throttled = self.max_rps and self.window_calls > self.max_rps
+            if throttled:
+                self.throttled += 1
+            delay = max(0.0, self.rng.gauss(self.latency, self.latency_jitter))
+        time.sleep(delay)
+        if throttled:
+            raise HTTPError('429 Client Error: Too Many Requests (simulated)')
+
+    def login(self, *args, **kwargs) -> dict:
+        self._call('login')
+        return {'access_token': 'simulated', 'detail': 'logged in with simulated broker'}
+
+    def _walk(self, crypto: str, steps: np.ndarray) -> np.ndarray:
+        # Deterministic per (seed, symbol, step) so history and live quotes agree
+        base = BASE_PRICES.get(crypto, 1.0)
+        if self.price_path == 'sine':
+            return base * (1 + 0.02 * np.sin(steps * PRICE_STEP * 2 * math.pi / 3600))
+        if self.price_path == 'replay':
+            closes = self._replay_closes(crypto)
+            if len(closes):
+                return closes[steps % len(closes)]
+        forward = self._cumulative(crypto, 0, max(int(steps.max()), 0) + 1)
+        backward = self._cumulative(crypto, 1, max(-int(steps.min()), 0) + 1)
+        log_moves = np.where(steps >= 0, forward[np.clip(steps, 0, None)], -backward[np.clip(-steps, 0, None)])
+        return base * np.exp(log_moves)
+
+    def _cumulative(self, crypto: str, direction: int, length: int) -> np.ndarray:
+        """
+        Cumulative walk outward from step 0 (direction 0 forward, 1 backward) at least length steps long.
+
+        Cached per symbol and extended by drawing only the missing steps from the same generator, which gives
+        the same values as drawing the whole walk at once, so any window is reproducible.
+        """
+        with self.walk_lock:
+            key = (crypto, direction)
+            if key not in self.walks:
+                seed = [self.seed, sum(map(ord, crypto))] + ([1] if direction else [])
+                self.walks[key] = (np.random.default_rng(seed), np.empty(0))
+            generator, walk = self.walks[key]
+            if len(walk) < length:
+                moves = generator.normal(0, self.volatility, length - len(walk))
+                # Summing on from the last cached value keeps the additions in the same order as one cumsum
+                extension = np.cumsum(np.concatenate([walk[-1:], moves]))[len(walk[-1:]):]
+                walk = np.concatenate([walk, extension])
+                self.walks[key] = (generator, walk)
+            return walk
+
+    def _replay_closes(self, crypto: str) -> np.ndarray:
+        if crypto not in self.replay_prices:
+            from backend.candles import CANDLES
+            self.replay_prices[crypto] = CANDLES.stored(crypto, '15second')['close_price']
+        return self.replay_prices[crypto]
+
+    def price(self, crypto: str, at: float = None) -> float:
+        step = int(((time.time() if at is None else at) - self.started_at) // PRICE_STEP)
+        return float(self._walk(crypto, np.array([step]))[0])
+
+    def get_crypto_info(self, symbol: str, info: str = None):
+        self._call('get_crypto_info')
+        data = {'id': f'sim-{symbol}', 'symbol': f'{symbol}-USD',
+                'asset_currency': {'code': symbol}}
+        return data[info] if info else data
+
+    def _quote(self, crypto: str) -> dict:
+        price = self.price(crypto)
+        return {'id': f'sim-{crypto}', 'symbol': f'{crypto}USD',
+                'mark_price': format_price(price),
+                'ask_price': format_price(price * (1 + SPREAD)),
+                'bid_price': format_price(price * (1 - SPREAD)),
+                'high_price': format_price(price * 1.01), 'low_price': format_price(price * 0.99),
+                'open_price': format_price(price), 'volume': '0'}
+
+    def get_crypto_quote(self, symbol: str, info: str = None):
+        self._call('get_crypto_quote')
+        quote = self._quote(symbol)
+        return quote[info] if info else quote
+
+    def request_get(self, url: str, data_type: str = 'regular', payload: dict = None):
+        # Only the batched forex quotes endpoint is routed through helper.request_get
+        self._call('request_get')
+        ids = (payload or {}).get('ids', '')
+        return [self._quote(pair_id[len('sim-'):]) for pair_id in ids.split(',') if pair_id.startswith('sim-')]
+
+    def get_crypto_historicals(self, symbol: str, interval: str = 'hour', span: str = 'week',
+                               bounds: str = '24_7', info: str = None) -> list:
+        self._call('get_crypto_historicals')
+        if interval not in INTERVAL_SECONDS or span not in SPAN_SECONDS:
+            return [None]
+        step = INTERVAL_SECONDS[interval]
+        now = time.time()
+        begins = np.arange((now - SPAN_SECONDS[span]) // step * step, now, step, dtype=np.int64)
+        sub_steps = max(1, step // PRICE_STEP)
+        # Sample a handful of price steps inside each candle for open/high/low/close
+        samples = np.linspace(0, sub_steps, min(sub_steps, 8) + 1)[:-1].astype(np.int64)
+        price_steps = ((begins - int(self.started_at)) // PRICE_STEP)[:, None] + samples[None, :]
+        prices = self._walk(symbol, price_steps.ravel()).reshape(price_steps.shape)
+        candles = []
+        for index, begins_at in enumerate(begins.tolist()):
+            row = prices[index]
+            candles.append({
+                'begins_at': datetime.fromtimestamp(begins_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'open_price': format_price(row[0]), 'close_price': format_price(row[-1]),
+                'high_price': format_price(row.max()), 'low_price': format_price(row.min()),
+                'volume': '0', 'session': 'reg', 'interpolated': False, 'symbol': symbol})
+        return [candle[info] for candle in candles] if info else candles
+
+    def get_crypto_positions(self, info: str = None) -> list:
+        self._call('get_crypto_positions')
+        with self.lock:
+            positions = [{'currency': {'code': crypto}, 'quantity': format_price(quantity),
+                          'cost_bases': [{'direct_quantity': format_price(quantity),
+                                          'direct_cost_basis': format_price(self.cost_basis.get(crypto, 0.0))}]}
+                         for crypto, quantity in self.holdings.items()]
+        return [position[info] for position in positions] if info else positions
+
+    def load_account_profile(self, info: str = None):
+        self._call('load_account_profile')
+        with self.lock:
+            profile = {'cash': format_price(self.cash),
+                       'cash_available_for_withdrawal': format_price(self.cash),
+                       'buying_power': format_price(self.cash)}
+        return profile[info] if info else profile
+
+    def _place(self, side: str, symbol: str, quantity: float) -> dict:
+        order = {'id': str(uuid.uuid4()), 'side': side, 'symbol': symbol, 'quantity': str(quantity),
+                 'price': format_price(self.price(symbol)), 'state': 'unconfirmed',
+                 'created_at': time.time(), 'cumulative_quantity': '0'}
+        with self.lock:
+            self.order_book[order['id']] = order
+        return dict(order)
+
+    def order_buy_crypto_by_quantity(self, symbol: str, quantity: float, timeInForce: str = 'gtc', jsonify: bool = True) -> dict:
+        self._call('order_buy_crypto_by_quantity')
+        return self._place('buy', symbol, float(quantity))
+
+    def order_sell_crypto_by_quantity(self, symbol: str, quantity: float, timeInForce: str = 'gtc', jsonify: bool = True) -> dict:
+        self._call('order_sell_crypto_by_quantity')
+        return self._place('sell', symbol, float(quantity))
+
+    def _settle(self, order: dict) -> None:
+        quantity = float(order['quantity'])
+        price = self.price(order['symbol'])
+        held = self.holdings.get(order['symbol'], 0.0)
+        can_fill = quantity > 0 and (held >= quantity if order['side'] == 'sell' else self.cash >= quantity * price)
+        if not can_fill or self.rng.random() >= self.fill_probability:
+            order['state'] = 'canceled'
+            return
+        order['state'] = 'filled'
+        order['price'] = format_price(price)
+        order['cumulative_quantity'] = order['quantity']
+        if order['side'] == 'buy':
+            self.holdings[order['symbol']] = held + quantity
+            self.cost_basis[order['symbol']] = self.cost_basis.get(order['symbol'], 0.0) + quantity * price
+            self.cash -= quantity * price
+        else:
+            self.cost_basis[order['symbol']] = self.cost_basis.get(order['symbol'], 0.0) * (1 - quantity / held)
+            self.holdings[order['symbol']] = held - quantity
+            self.cash += quantity * price
+
+    def get_crypto_order_info(self, order_id: str) -> dict:
+        self._call('get_crypto_order_info')
+        with self.lock:
+            order = self.order_book[order_id]
+            if order['state'] in ('unconfirmed', 'confirmed') and time.time() - order['created_at'] >= self.fill_delay:
+                self._settle(order)
+            elif order['state'] == 'unconfirmed':
+                order['state'] = 'confirmed'
+            return dict(order)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'calls': dict(self.calls), 'throttled': self.throttled, 'orders': len(self.order_book)}
@@ -0,0 +1,32 @@
+import os
+import time
+from contextlib import contextmanager
+
+STARTUP_TARGET = float(os.environ.get('STARTUP_TARGET', 5.0))
+STARTUP_STEPS = []
+
+
+@contextmanager
+def timed(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_STEPS.append((step, time.perf_counter() - started))
+
+
+def startup_report() -> dict:
+    total = sum(elapsed for _, elapsed in STARTUP_STEPS)
+    return {
+        'steps': [{'step': step, 'seconds': round(elapsed, 4)} for step, elapsed in STARTUP_STEPS],
+        'total': round(total, 4),
+        'target': STARTUP_TARGET,
+        'within_target': total <= STARTUP_TARGET,
+    }
+
+
+def print_startup_report() -> None:
+    report = startup_report()
+    for step in report['steps']:
+        print(f"{step['step']:<32} {step['seconds']:.3f}s")
+    print(f"{'startup total':<32} {report['total']:.3f}s (target {report['target']:.1f}s)")
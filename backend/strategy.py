@@ -0,0 +1,32 @@
+MINS = {
+    'DOGE': 1.0,
+    'XLM': 1.0,
+    'BTC': 0.000001,
+    'SHIB': 500,
+    'XTZ': 0.01,
+    'ETH': 0.0001
+}
+SELL_FRACTION = 0.75
+GAIN_THRESHOLD = 1.0
+
+
+def is_greater_than(value: float, threshold: float, tol=1e-9) -> bool:
+    adjusted_threshold = threshold - tol
+    return value > adjusted_threshold
+
+
+def check_if_sell(crypto: str, amount_quantity: float) -> bool:
+    return is_greater_than(amount_quantity, MINS[crypto])
+
+
+def take_profit_quantity(crypto: str, initial_value: float, price: float, holdings: float,
+                         sell_fraction: float = SELL_FRACTION, threshold: float = GAIN_THRESHOLD) -> float:
+    # Sell part of any gain over the starting value, or all of it if the gain is under the threshold
+    current_value = price * holdings
+    to_sell = current_value - initial_value
+    if is_greater_than(to_sell, threshold):
+        to_sell = to_sell * sell_fraction
+    to_sell_quantity = to_sell / price
+    if is_greater_than(current_value, initial_value) and check_if_sell(crypto, to_sell_quantity):
+        return to_sell_quantity
+    return 0.0
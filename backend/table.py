@@ -1,11 +1,13 @@
 import base64
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from matplotlib.ticker import MaxNLocator
-from datetime import datetime
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
 
 
 interval_dict = {'15second': {'name': '15 seconds', 'type': 'seconds', 'value': 15},
@@ -30,33 +32,134 @@ date_formats = {
 }
 
 
-def plot_crypto_prices(data: list, interval: str, span: str, price_data: list) -> str:
+PRICE_SERIES = [('close_price', 'Close Price', 'o'), ('high_price', 'High Price', 'x'),
+                ('low_price', 'Low Price', '^'), ('open_price', 'Open Price', '*')]
+# Indicators on their own scale get a panel under the price chart
+OSCILLATORS = ('rsi_14', 'volatility')
+RENDER_CACHE_BYTES = 32 * 1024 * 1024
+# Pooled figures are cleared and reused instead of going through pyplot's global figure manager
+FIGURE_POOL = queue.LifoQueue()
+
+
+def acquire_figure() -> Figure:
+    try:
+        return FIGURE_POOL.get_nowait()
+    except queue.Empty:
+        figure = Figure(figsize=(10, 5))
+        FigureCanvasAgg(figure)
+        return figure
+
+
+def release_figure(figure: Figure) -> None:
+    figure.clear()
+    FIGURE_POOL.put(figure)
+
+
+def render_crypto_prices(candles: dict, interval: str, span: str, price_data: list, overlays: dict = None) -> bytes:
     interval = interval_dict[interval]
     span = span_dict[span]
-    dates = [datetime.fromisoformat(
-        item['begins_at'].replace('Z', '')) for item in data]
-    plt.figure(figsize=(10, 5))
-    if 'close_price' in price_data:
-        close_prices = [float(item['close_price']) for item in data]
-        plt.plot(dates, close_prices, label='Close Price', marker='o')
-    if 'high_price' in price_data:
-        high_prices = [float(item['high_price']) for item in data]
-        plt.plot(dates, high_prices, label='High Price', marker='x')
-    if 'low_price' in price_data:
-        low_prices = [float(item['low_price']) for item in data]
-        plt.plot(dates, low_prices, label='Low Price', marker='^')
-    if 'open_price' in price_data:
-        low_prices = [float(item['open_price']) for item in data]
-        plt.plot(dates, low_prices, label='Open Price', marker='*')
-    plt.gca().xaxis.set_major_formatter(
-        mdates.DateFormatter(date_formats[interval['type']]))
-    plt.gca().xaxis.set_major_locator(MaxNLocator(nbins=10))
-    plt.gcf().autofmt_xdate()
-    plt.tight_layout()
-    plt.legend()
-    plt.grid(True)
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    buf.close()
-    return image_base64
+    overlays = overlays or {}
+    dates = candles['begins_at'].astype('datetime64[s]')
+    oscillators = [name for name in overlays if name in OSCILLATORS]
+    figure = acquire_figure()
+    try:
+        if oscillators:
+            grid = figure.add_gridspec(2, 1, height_ratios=(3, 1), hspace=0.08)
+            ax = figure.add_subplot(grid[0])
+            lower = figure.add_subplot(grid[1], sharex=ax)
+        else:
+            ax = figure.add_subplot()
+        for field, label, marker in PRICE_SERIES:
+            if field in price_data:
+                ax.plot(dates, candles[field], label=label, marker=marker)
+        for name, values in overlays.items():
+            if name not in OSCILLATORS:
+                ax.plot(dates, values, label=name, linewidth=1)
+        if oscillators:
+            for name in oscillators:
+                lower.plot(dates, overlays[name], label=name, linewidth=1)
+            ax.tick_params(labelbottom=False)
+            lower.legend(loc='upper left')
+            lower.grid(True)
+        axis = lower if oscillators else ax
+        axis.xaxis.set_major_formatter(
+            mdates.DateFormatter(date_formats[interval['type']]))
+        axis.xaxis.set_major_locator(MaxNLocator(nbins=10))
+        figure.autofmt_xdate()
+        # Fixed margins instead of tight_layout, which re-measures every label on each render
+        figure.subplots_adjust(left=0.08, right=0.98, top=0.96, bottom=0.18)
+        ax.legend()
+        ax.grid(True)
+        buf = BytesIO()
+        figure.savefig(buf, format='png')
+        return buf.getvalue()
+    finally:
+        release_figure(figure)
+
+
+def plot_crypto_prices(candles: dict, interval: str, span: str, price_data: list, overlays: dict = None) -> str:
+    return base64.b64encode(render_crypto_prices(candles, interval, span, price_data, overlays)).decode('utf-8')
+
+
+class RenderCache:
+    def __init__(self, budget: int = RENDER_CACHE_BYTES):
+        self.budget = budget
+        self.images = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> tuple:
+        with self.lock:
+            entry = self.images.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.images.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, image: bytes, etag: str) -> None:
+        with self.lock:
+            if key in self.images:
+                self.size -= len(self.images.pop(key)[0])
+            self.images[key] = (image, etag)
+            self.size += len(image)
+            while self.size > self.budget and len(self.images) > 1:
+                _, (evicted, _) = self.images.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.images.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'entries': len(self.images), 'bytes': self.size, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+RENDER_CACHE = RenderCache()
+
+
+def cached_crypto_chart(crypto: str, candles: dict, interval: str, span: str, price_data: list, variant: tuple = (),
+                        overlays: dict = None) -> tuple:
+    """
+    Returns (png bytes, etag) for a chart, rendering it only when the request or the newest candle changed.
+
+    variant carries any extra request options (downsampling) that change the image; overlay names join the key
+    since their values follow from the candles.
+    """
+    latest = (int(candles['begins_at'][-1]), float(candles['close_price'][-1])) if len(candles['begins_at']) else ()
+    key = (crypto, interval, span, tuple(price_data), len(candles['begins_at'])) + latest + tuple(variant) + tuple(overlays or ())
+    cached = RENDER_CACHE.get(key)
+    if cached is not None:
+        return cached
+    image = render_crypto_prices(candles, interval, span, price_data, overlays)
+    etag = hashlib.sha1(image).hexdigest()
+    RENDER_CACHE.put(key, image, etag)
+    return image, etag
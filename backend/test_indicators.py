@@ -0,0 +1,48 @@
+import numpy as np
+from backend.candles import PRICE_FIELDS, take
+from backend.indicators import IndicatorEngine, compute_indicators, EMA_PERIODS, RSI_PERIOD
+
+INTERVAL = '15second'
+NAMES = [f'ema_{period}' for period in EMA_PERIODS] + [f'rsi_{RSI_PERIOD}']
+
+
+def make_candles(count: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    candles = {'begins_at': np.arange(count, dtype=np.int64) * 15}
+    for field in PRICE_FIELDS:
+        candles[field] = close.copy()
+    candles['volume'] = rng.uniform(0, 10, count)
+    return candles
+
+
+def assert_matches(values: dict, expected: dict) -> None:
+    for name in NAMES:
+        np.testing.assert_allclose(values[name], expected[name], rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_incremental_matches_one_shot():
+    candles = make_candles(800)
+    engine = IndicatorEngine(candles=None)
+    # Everything closed: the second window only extends the series with the candles after the first
+    first = take(candles, slice(0, 600))
+    assert_matches(engine.compute('BTC', INTERVAL, first, NAMES, now=1e12), compute_indicators(first))
+    window = take(candles, slice(100, 800))
+    expected = {name: values[100:] for name, values in compute_indicators(candles).items()}
+    assert_matches(engine.compute('BTC', INTERVAL, window, NAMES, now=1e12), expected)
+    assert engine.stats()['incremental'] == 800
+    assert engine.stats()['rebuilds'] == 0
+
+
+def test_open_candle_is_previewed_then_recomputed():
+    candles = make_candles(300, seed=1)
+    engine = IndicatorEngine(candles=None)
+    last_begins = int(candles['begins_at'][-1])
+    # The last candle is still open, so it is computed but not kept
+    open_values = engine.compute('BTC', INTERVAL, candles, NAMES, now=last_begins + 1)
+    assert_matches(open_values, compute_indicators(candles))
+    assert engine.stats()['incremental'] == 299
+    # It closes with a different price; the committed state must not have absorbed the preview
+    closed = {column: values.copy() for column, values in candles.items()}
+    closed['close_price'][-1] *= 1.05
+    assert_matches(engine.compute('BTC', INTERVAL, closed, NAMES, now=last_begins + 15), compute_indicators(closed))
@@ -0,0 +1,81 @@
+import os
+from backend.journal import OrderJournal, JOURNAL_FILE
+
+DETAILS = {'crypto': 'BTC', 'type': 'sell', 'quantity': 2.0, 'price': 10.0}
+FILL = {'state': 'filled', 'cumulative_quantity': '2', 'average_price': '10'}
+
+
+def write_orders(directory: str, **options) -> OrderJournal:
+    journal = OrderJournal(directory, **options)
+    journal.open()
+    journal.placed('a', DETAILS, {'state': 'unconfirmed'})
+    journal.placed('b', DETAILS, {'state': 'unconfirmed'})
+    journal.finished('a', 'filled', FILL).result(5)
+    return journal
+
+
+def test_replay_restores_pending_orders_and_totals(tmp_path):
+    write_orders(str(tmp_path)).close()
+    journal = OrderJournal(str(tmp_path))
+    pending = journal.open()
+    assert [record['id'] for record in pending] == ['b']
+    assert journal.seq == 3
+    assert journal.stats()['replayed'] == 3
+    summary = journal.summary()
+    assert summary['sold_at_fill_price'] == 20.0
+    assert summary['fills'] == 1
+    journal.close()
+
+
+def test_torn_line_is_dropped_and_truncated(tmp_path):
+    write_orders(str(tmp_path)).close()
+    path = os.path.join(str(tmp_path), JOURNAL_FILE)
+    size = os.path.getsize(path)
+    with open(path, 'a') as file:
+        file.write('{"event":"status","id":"b","sta')
+    journal = OrderJournal(str(tmp_path))
+    assert [record['id'] for record in journal.open()] == ['b']
+    assert journal.stats()['torn'] == 1
+    assert os.path.getsize(path) == size
+    # Lines appended after the truncation replay normally
+    journal.finished('b', 'failed', {'state': 'canceled'}).result(5)
+    journal.close()
+    journal = OrderJournal(str(tmp_path))
+    assert journal.open() == []
+    assert journal.get('b')['status'] == 'failed'
+    journal.close()
+
+
+def test_compaction_snapshot_skips_seqs_it_already_has(tmp_path):
+    journal = write_orders(str(tmp_path))
+    path = os.path.join(str(tmp_path), JOURNAL_FILE)
+    with open(path, 'rb') as file:
+        before = file.read()
+    journal.compact()
+    journal.close()
+    assert os.path.getsize(path) == 0
+    # A crash between writing the snapshot and restarting the journal leaves both behind
+    with open(path, 'wb') as file:
+        file.write(before)
+    journal = OrderJournal(str(tmp_path))
+    assert [record['id'] for record in journal.open()] == ['b']
+    assert journal.stats()['replayed'] == 0
+    assert journal.summary()['fills'] == 1
+    journal.finished('b', 'filled', FILL).result(5)
+    journal.close()
+    journal = OrderJournal(str(tmp_path))
+    assert journal.open() == []
+    assert journal.seq == 4
+    assert journal.summary()['fills'] == 2
+    journal.close()
+
+
+def test_writer_compacts_after_threshold(tmp_path):
+    journal = write_orders(str(tmp_path), compact_every=2)
+    journal.finished('b', 'filled', FILL).result(5)
+    journal.close()
+    assert journal.stats()['compactions'] >= 1
+    journal = OrderJournal(str(tmp_path))
+    assert journal.open() == []
+    assert journal.summary()['sold_at_fill_price'] == 40.0
+    journal.close()
@@ -0,0 +1,45 @@
+import time
+from backend.trade_store import TradeStore, encode_cursor, decode_cursor
+
+
+def make_trade(trade_id: str, status: str = 'pending') -> dict:
+    return {'id': trade_id, 'type': 'sell', 'crypto': 'BTC', 'amount': '1', 'price': '$10', 'value': '$10',
+            'status': status, 'time': '10:00 AM'}
+
+
+def pages(store: TradeStore, limit: int, **filters) -> list:
+    # Walks the keyset cursor the way /get-trades does, one extra row telling whether there's another page
+    updated = filters.get('updated_since') is not None
+    ids = []
+    cursor = None
+    while True:
+        rows = store.query(cursor=cursor, limit=limit + 1, **filters)
+        page = rows[:limit]
+        ids.extend(row['id'] for row in page)
+        if len(rows) <= limit:
+            return ids
+        cursor = decode_cursor(encode_cursor(page[-1], updated=updated))
+
+
+def test_pages_newest_first_without_gaps_or_repeats(tmp_path):
+    store = TradeStore(str(tmp_path / 'trades.db'))
+    # One batch shares a created_at, so the seq tiebreak decides the order
+    store.upsert_many([make_trade(f't{index}') for index in range(5)])
+    time.sleep(0.01)
+    store.upsert_many([make_trade(f't{index}') for index in range(5, 7)])
+    assert pages(store, 2) == [f't{index}' for index in reversed(range(7))]
+    assert pages(store, 10) == pages(store, 1)
+
+
+def test_since_cursor_returns_changes_in_update_order(tmp_path):
+    store = TradeStore(str(tmp_path / 'trades.db'))
+    store.upsert_many([make_trade(f't{index}') for index in range(5)])
+    assert pages(store, 2, updated_since=0.0) == [f't{index}' for index in range(5)]
+    latest = store.latest_update()
+    time.sleep(0.01)
+    store.upsert(make_trade('t3', 'filled'))
+    time.sleep(0.01)
+    store.upsert_many([make_trade('t1', 'failed'), make_trade('t5')])
+    assert pages(store, 1, updated_since=latest) == ['t3', 't1', 't5']
+    assert pages(store, 2, updated_since=latest, statuses=['failed']) == ['t1']
+    assert pages(store, 2, updated_since=store.latest_update()) == []
@@ -0,0 +1,239 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+TRADES_DB = 'trades.db'
+TRADE_FIELDS = ['id', 'type', 'crypto', 'amount',
+                'price', 'value', 'status', 'time']
+PUBLIC_FIELDS = TRADE_FIELDS + ['created_at', 'updated_at']
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT,
+    crypto TEXT,
+    amount TEXT,
+    price TEXT,
+    value TEXT,
+    status TEXT,
+    time TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_status ON trades (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_trades_created ON trades (created_at);
+CREATE INDEX IF NOT EXISTS idx_trades_updated ON trades (updated_at);
+CREATE INDEX IF NOT EXISTS idx_trades_crypto ON trades (crypto, created_at);
+"""
+
+
+def validate_trade(trade) -> None:
+    if not isinstance(trade, dict):
+        raise ValueError('Trade must be a JSON object')
+    for field in ('id', 'status'):
+        if not trade.get(field):
+            raise ValueError(f'Trade is missing {field}')
+
+
+def legacy_timestamp(trade_time: str, reference: float) -> float:
+    # trades.csv only kept "%I:%M %p", so anchor it to the file's last write
+    reference_dt = datetime.fromtimestamp(reference)
+    try:
+        parsed = datetime.strptime(trade_time.replace(' ', ''), "%I:%M%p")
+    except ValueError:
+        return reference
+    trade_dt = reference_dt.replace(
+        hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+    if trade_dt > reference_dt:
+        trade_dt -= timedelta(days=1)
+    return trade_dt.timestamp()
+
+
+class TradeStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self.conn = conn
+        return self.conn
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def upsert_many(self, trades: list) -> list:
+        """
+        Inserts new trades and updates the status of known ones in one transaction.
+
+        Returns a (record, previous_status) pair per trade; previous_status is None for new trades. A trade that
+        is invalid or fails to write gets its exception in place of the pair instead of rolling back the others.
+        """
+        results = []
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for trade in trades:
+                    try:
+                        validate_trade(trade)
+                    except ValueError as e:
+                        results.append(e)
+                        continue
+                    conn.execute('SAVEPOINT trade')
+                    try:
+                        results.append(self._upsert_row(conn, trade, now))
+                        conn.execute('RELEASE trade')
+                    except (sqlite3.Error, TypeError, ValueError) as e:
+                        conn.execute('ROLLBACK TO trade')
+                        conn.execute('RELEASE trade')
+                        results.append(e)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return results
+
+    def _upsert_row(self, conn: sqlite3.Connection, trade: dict, now: float) -> tuple:
+        row = conn.execute(
+            'SELECT * FROM trades WHERE id = ?', (trade['id'],)).fetchone()
+        if row is not None:
+            conn.execute('UPDATE trades SET status = ?, updated_at = ? WHERE id = ?',
+                         (trade['status'], now, trade['id']))
+            previous_status = row['status']
+        else:
+            record = [trade.get(field, '') for field in TRADE_FIELDS]
+            conn.execute('INSERT INTO trades (id, type, crypto, amount, price, value, status, time, created_at, updated_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', record + [now, now])
+            previous_status = None
+        row = conn.execute(
+            'SELECT * FROM trades WHERE id = ?', (trade['id'],)).fetchone()
+        return dict(row), previous_status
+
+    def upsert(self, trade: dict) -> tuple:
+        return self.upsert_many([trade])[0]
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, trade_id: str) -> dict:
+        rows = self._query('SELECT * FROM trades WHERE id = ?', (trade_id,))
+        return rows[0] if rows else None
+
+    def all_trades(self) -> list:
+        return self._query('SELECT * FROM trades ORDER BY seq')
+
+    def trades_by_status(self, status: str) -> list:
+        return self._query('SELECT * FROM trades WHERE status = ? ORDER BY created_at', (status,))
+
+    def latest_update(self) -> float:
+        return self._query('SELECT MAX(updated_at) AS latest FROM trades')[0]['latest'] or 0.0
+
+    def query(self, statuses: list = None, cryptos: list = None, start: float = None, end: float = None,
+              failed_since: float = None, updated_since: float = None, cursor: tuple = None,
+              limit: int = PAGE_SIZE) -> list:
+        """
+        Returns up to limit matching trades, newest first by created_at, or oldest change first by updated_at
+        when updated_since is given.
+
+        cursor is the (sort key, seq) of the previous page's last row; keyset pagination stays on the
+        created_at/updated_at indexes instead of scanning skipped rows like OFFSET would.
+        """
+        clauses = []
+        params = []
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if cryptos:
+            clauses.append(f"crypto IN ({', '.join('?' * len(cryptos))})")
+            params.extend(cryptos)
+        if start is not None:
+            clauses.append('created_at >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('created_at < ?')
+            params.append(end)
+        if failed_since is not None:
+            clauses.append("(status != 'failed' OR created_at > ?)")
+            params.append(failed_since)
+        if updated_since is not None:
+            clauses.append('updated_at > ?')
+            params.append(updated_since)
+            if cursor is not None:
+                clauses.append('(updated_at > ? OR (updated_at = ? AND seq > ?))')
+                params.extend([cursor[0], cursor[0], cursor[1]])
+            order = 'updated_at, seq'
+        else:
+            if cursor is not None:
+                clauses.append('(created_at < ? OR (created_at = ? AND seq < ?))')
+                params.extend([cursor[0], cursor[0], cursor[1]])
+            order = 'created_at DESC, seq DESC'
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        return self._query(f'SELECT * FROM trades {where}ORDER BY {order} LIMIT ?', tuple(params) + (limit,))
+
+    def count(self) -> int:
+        return self._query('SELECT COUNT(*) AS n FROM trades')[0]['n']
+
+    def migrate_csv(self, csv_path: str) -> int:
+        if not os.path.exists(csv_path) or self.count() > 0:
+            return 0
+        reference = os.path.getmtime(csv_path)
+        with open(csv_path, mode='r', newline='') as file:
+            rows = list(csv.DictReader(file))
+        with self.lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for row in rows:
+                    created_at = legacy_timestamp(row.get('time', ''), reference)
+                    record = [row.get(field, '') for field in TRADE_FIELDS]
+                    conn.execute('INSERT OR REPLACE INTO trades (id, type, crypto, amount, price, value, status, time, created_at, updated_at) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', record + [created_at, created_at])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        os.rename(csv_path, csv_path + '.migrated')
+        return len(rows)
+
+
+def public_trade(record: dict) -> dict:
+    return {field: record.get(field, '') for field in PUBLIC_FIELDS}
+
+
+def parse_timestamp(value: str) -> float:
+    # Query parameters take epoch seconds or ISO 8601
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def encode_cursor(record: dict, updated: bool = False) -> str:
+    return f"{record['updated_at' if updated else 'created_at']!r}:{record['seq']}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    key, seq = cursor.rsplit(':', 1)
+    return float(key), int(seq)
+
+
+TRADE_STORE = TradeStore(TRADES_DB)
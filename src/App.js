@@ -1,5 +1,5 @@
 import "./App.css";
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import TradeDataTable from "./TradeDataTable/TradeDataTable.js";
 import TrackCryptoSection from "./TrackCryptoSection/TrackCryptoSection.js";
 import BuyCryptoSection from "./BuyCryptoSection/BuyCryptoSection.js";
@@ -20,6 +20,22 @@ function formatNumber(value) {
 }
 
 const API_URL = "http://127.0.0.1:5000";
+const TRADE_LOG_SIZE = 100;
+
+function mergeTrades(prevTrades, changedTrades) {
+    // Replace known trades in place, put new ones on top, newest first
+    const byId = new Map(prevTrades.map((trade) => [trade.id, trade]));
+    const added = [];
+    changedTrades.forEach((trade) => {
+        if (!byId.has(trade.id)) {
+            added.push(trade);
+        }
+        byId.set(trade.id, trade);
+    });
+    added.sort((a, b) => b.created_at - a.created_at);
+    const updated = prevTrades.map((trade) => byId.get(trade.id));
+    return [...added, ...updated].slice(0, TRADE_LOG_SIZE);
+}
 
 const App = () => {
     const [trades, setTrades] = useState([]);
@@ -27,6 +43,8 @@ const App = () => {
     const [profit, setProfit] = useState("");
     const [cryptos, setCryptos] = useState([]);
     const [positions, setPositions] = useState({});
+    const [events, setEvents] = useState(null);
+    const tradesSince = useRef(null);
     const [trackSections, setTrackSections] = useState([{ id: 1 }]); // Initially one TrackCryptoSection
 
     const addTrackSection = () => {
@@ -54,20 +72,48 @@ const App = () => {
 
     const fetchTradesData = useCallback(async () => {
         try {
-            const response = await fetch(`${API_URL}/get-trades`, {
-                headers: createHeaders(),
-                method: "GET",
-            });
+            const response = await fetch(
+                `${API_URL}/get-trades?limit=${TRADE_LOG_SIZE}`,
+                {
+                    headers: createHeaders(),
+                    method: "GET",
+                }
+            );
             const data = await response.json();
-            // Check if the trades array size has changed
-            if (data.length !== trades.length) {
-                setTrades(data); // Update the trades state only if there's a change
-                fetchPositions(); // Fetch positions if the trades array size has changed
-            }
+            tradesSince.current = data.since;
+            setTrades(data.trades);
         } catch (error) {
             console.error("Failed to fetch trades:", error);
         }
-    }, [trades.length, fetchPositions]);
+    }, []);
+
+    const fetchTradeChanges = useCallback(async () => {
+        if (tradesSince.current === null) return;
+        try {
+            // Only rows created or updated since the last fetch, a page at a time
+            let cursor = null;
+            do {
+                const params = new URLSearchParams({
+                    since: tradesSince.current,
+                    limit: TRADE_LOG_SIZE,
+                });
+                if (cursor) params.set("cursor", cursor);
+                const response = await fetch(
+                    `${API_URL}/get-trades?${params.toString()}`,
+                    {
+                        headers: createHeaders(),
+                        method: "GET",
+                    }
+                );
+                const data = await response.json();
+                tradesSince.current = data.since;
+                cursor = data.next_cursor;
+                setTrades((prevTrades) => mergeTrades(prevTrades, data.trades));
+            } while (cursor);
+        } catch (error) {
+            console.error("Failed to fetch trade changes:", error);
+        }
+    }, []);
 
     const fetchAccountInfo = useCallback(async () => {
         try {
@@ -98,19 +144,6 @@ const App = () => {
         }
     }, []);
 
-    const fetchProfit = useCallback(async () => {
-        try {
-            const response = await fetch(`${API_URL}/todays-change`, {
-                headers: createHeaders(),
-                method: "GET",
-            });
-            const data = await response.json();
-            setProfit(data.successfulTradesSum.toFixed(2));
-        } catch (error) {
-            console.error("Failed to fetch profit:", error);
-        }
-    }, []);
-
     const currentDate = new Date().toLocaleDateString("en-US", {
         month: "2-digit",
         day: "2-digit",
@@ -121,28 +154,65 @@ const App = () => {
         fetchTradesData();
         fetchAccountInfo();
         fetchCryptos();
-        fetchProfit();
-    }, [fetchTradesData, fetchAccountInfo, fetchCryptos, fetchProfit]);
+    }, [fetchTradesData, fetchAccountInfo, fetchCryptos]);
 
     useEffect(() => {
         fetchInitialData();
         fetchPositions();
         const cashInterval = setInterval(fetchAccountInfo, 600000); // 10 minutes
-        const profitInterval = setInterval(fetchProfit, 10000); // 10 seconds
-        const tradeInterval = setInterval(fetchTradesData, 10000); // 10 seconds
 
         return () => {
             clearInterval(cashInterval);
-            clearInterval(profitInterval);
-            clearInterval(tradeInterval);
         };
-    }, [
-        fetchInitialData,
-        fetchPositions,
-        fetchAccountInfo,
-        fetchProfit,
-        fetchTradesData,
-    ]);
+    }, [fetchInitialData, fetchPositions, fetchAccountInfo]);
+
+    useEffect(() => {
+        // Trade status changes, P&L and quote ticks are pushed by the server instead of polled
+        const source = new EventSource(`${API_URL}/stream`);
+        source.addEventListener("trade", (event) => {
+            const trade = JSON.parse(event.data);
+            tradesSince.current = Math.max(
+                tradesSince.current || 0,
+                trade.updated_at
+            );
+            setTrades((prevTrades) => mergeTrades(prevTrades, [trade]));
+            if (trade.status === "filled") {
+                fetchPositions();
+            }
+        });
+        source.addEventListener("pnl", (event) => {
+            const summary = JSON.parse(event.data);
+            setProfit(summary.total.toFixed(2));
+        });
+        source.addEventListener("quotes", (event) => {
+            const quotes = JSON.parse(event.data);
+            setPositions((prevPositions) => {
+                const updated = { ...prevPositions };
+                // /positions values holdings at the bid, so ticks must too
+                Object.entries(quotes).forEach(([crypto, prices]) => {
+                    if (updated[crypto]) {
+                        updated[crypto] = { ...updated[crypto], curr_price: prices.bid_price };
+                    }
+                });
+                return updated;
+            });
+        });
+        let reconnecting = false;
+        source.onopen = () => {
+            // Catch up on anything that changed while the stream was down
+            if (reconnecting) fetchTradeChanges();
+            reconnecting = false;
+        };
+        source.onerror = (error) => {
+            reconnecting = true;
+            console.error("Event stream error, reconnecting:", error);
+        };
+        setEvents(source);
+
+        return () => {
+            source.close();
+        };
+    }, [fetchPositions, fetchTradeChanges]);
 
     return (
         <div className="container">
@@ -159,7 +229,9 @@ const App = () => {
                         availableCash={availableCash}
                         formatNumber={formatNumber}
                     />
-                    <AutoTradingSection cryptos={cryptos}></AutoTradingSection>
+                    <AutoTradingSection
+                        cryptos={cryptos}
+                        events={events}></AutoTradingSection>
                     {trackSections.map((section, index) => (
                         <TrackCryptoSection
                             key={section.id}
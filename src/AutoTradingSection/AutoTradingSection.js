@@ -1,16 +1,17 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "./AutoTradingSection.css";
 import DropdownCheckbox from "../CustomDropdown/CustomDropdown.js";
 const { createHeaders } = require("../headers.js");
 const API_URL = "http://127.0.0.1:5000";
 
-const AutoTradingSection = ({ cryptos }) => {
+const AutoTradingSection = ({ cryptos, events }) => {
     const [selectedCryptos, setSelectedCryptos] = useState([]);
     const [duration, setDuration] = useState("");
     const [timeUnit, setTimeUnit] = useState("seconds");
     const [autoTrading, setAutoTrading] = useState(false);
     const [countdown, setCountdown] = useState(null);
     const [intervalId, setIntervalId] = useState(null);
+    const sessionId = useRef(null);
 
     useEffect(() => {
         return () => {
@@ -18,6 +19,30 @@ const AutoTradingSection = ({ cryptos }) => {
         };
     }, [intervalId]);
 
+    useEffect(() => {
+        if (!events) return;
+        // The server announces when a run ends, whether it timed out or was stopped elsewhere
+        const onAutoTrade = (event) => {
+            const state = JSON.parse(event.data);
+            // Other sessions (other accounts or symbol groups) report here too
+            if (state.session && state.session !== sessionId.current) return;
+            if (!state.running) {
+                sessionId.current = null;
+                setAutoTrading(false);
+                setCountdown(null);
+                setSelectedCryptos([]);
+                setIntervalId((id) => {
+                    if (id) clearInterval(id);
+                    return null;
+                });
+            }
+        };
+        events.addEventListener("auto-trade", onAutoTrade);
+        return () => {
+            events.removeEventListener("auto-trade", onAutoTrade);
+        };
+    }, [events]);
+
     const toggleAutoTrading = async () => {
         try {
             const cryptosArray = selectedCryptos.map((option) => option.value);
@@ -33,6 +58,8 @@ const AutoTradingSection = ({ cryptos }) => {
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
+            const data = await response.json();
+            sessionId.current = data.session ? data.session.id : null;
             setAutoTrading(!autoTrading);
 
             if (!autoTrading) {
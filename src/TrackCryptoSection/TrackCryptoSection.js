@@ -78,7 +78,7 @@ const TrackCryptoSection = ({
         closeModal();
         try {
             const response = await fetch(
-                `${API_URL}/get-crypto-graph/${selectedCrypto}/${interval}/${span}/${priceDataString}`,
+                `${API_URL}/get-crypto-graph/${selectedCrypto}/${interval}/${span}/${priceDataString}?format=compact`,
                 { headers: createHeaders(), method: "GET" }
             );
             if (response.status === 500) {
@@ -13,6 +13,16 @@ const getTradeRowClass = (status) => {
     }
 };
 
+const formatTradeTime = (trade) => {
+    if (!trade.created_at) return trade.time;
+    return new Date(trade.created_at * 1000).toLocaleString("en-US", {
+        month: "2-digit",
+        day: "2-digit",
+        hour: "2-digit",
+        minute: "2-digit",
+    });
+};
+
 const TradeDataTable = ({ trades, formatNumber }) => (
     <div className="table-wrapper">
         <table className="table table-striped">
@@ -29,8 +39,8 @@ const TradeDataTable = ({ trades, formatNumber }) => (
                 </tr>
             </thead>
             <tbody>
-                {trades.map((trade, index) => (
-                    <tr key={index} className={getTradeRowClass(trade.status)}>
+                {trades.map((trade) => (
+                    <tr key={trade.id} className={getTradeRowClass(trade.status)}>
                         <td>{trade.id.substring(0, 8)}</td>
                         <td>{trade.type.toUpperCase()}</td>
                         <td>{trade.crypto}</td>
@@ -45,7 +55,7 @@ const TradeDataTable = ({ trades, formatNumber }) => (
                         </td>
                         <td>{trade.value}</td>
                         <td>{trade.status.toUpperCase()}</td>
-                        <td>{trade.time}</td>
+                        <td>{formatTradeTime(trade)}</td>
                     </tr>
                 ))}
             </tbody>